@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+
+from cassette import CASSETTE, CassetteMiss
+from settings import FACT_CACHE_DIR
+from transport import AgentError, get_transport
+
+
+class HostFacts:
+    """In-memory snapshot of the paths, packages, services and commands of one host."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def path(self, path):
+        return self.data["paths"].get(path) or {"lexists": False, "exists": False}
+
+    def test(self, flag, path):
+        """Evaluate a shell file test such as '-f', '-d', '-L' or '-e'."""
+        info = self.path(path)
+        if flag == '-e':
+            return info["exists"]
+        if flag == '-f':
+            return info["exists"] and info["type"] == 'regular file'
+        if flag == '-d':
+            return info["exists"] and info["type"] == 'directory'
+        if flag == '-L':
+            return info["lexists"] and info["kind"] == 'symbolic link'
+        raise ValueError(f"Unsupported file test {flag}")
+
+    def stat(self, path, fmt):
+        """Format lstat details like `stat -c` for %F, %U, %G and %a, or None if missing."""
+        info = self.path(path)
+        if not info["lexists"]:
+            return None
+        return (fmt.replace('%F', info["kind"])
+                   .replace('%U', info["owner"])
+                   .replace('%G', info["group"])
+                   .replace('%a', info["mode"]))
+
+    def package(self, name):
+        return self.data["packages"].get(name)
+
+    def package_installed(self, name):
+        package = self.package(name)
+        return bool(package) and package["status"] == 'install ok installed'
+
+    def package_version(self, name):
+        package = self.package(name)
+        return package["version"] if self.package_installed(name) else None
+
+    def service(self, name):
+        return self.data["services"].get(name) or {"active": None, "enabled": None}
+
+    def command(self, command):
+        """Return (stdout, err) for a collected command, like run_remote_command."""
+        result = self.data["commands"].get(command)
+        if result is None:
+            raise KeyError(f"Command '{command}' was not collected")
+        if result["rc"] != 0:
+            return None, f"Error: {result['stderr']}"
+        return result["stdout"], None
+
+    def file(self, path):
+        return self.data["files"].get(path)
+
+
+# Spec section, agent method answering each entry of it
+SPEC_METHODS = (
+    ("paths", "stat"),
+    ("packages", "dpkg_query"),
+    ("services", "systemctl"),
+    ("commands", "exec"),
+    ("files", "read_file"),
+)
+
+
+def collect_facts(transport, spec):
+    """Fetch a fact snapshot for the declared spec in one batch of agent calls."""
+    calls = [(method, entry) for section, method in SPEC_METHODS for entry in spec.get(section, [])]
+    try:
+        results = iter(transport.batch(calls))
+    except AgentError as e:
+        raise RuntimeError(f"Fact collection failed: {e}")
+    return HostFacts({
+        section: {entry: next(results) for entry in spec.get(section, [])}
+        for section, _ in SPEC_METHODS
+    })
+
+
+def read_fact_cache(host):
+    """Load the facts Ansible cached for a host during the playbook run, if any.
+
+    ansible-core 2.19 names the file s<schema>_<host> and wraps the facts in a
+    JSON-encoded __payload__; earlier releases store them plainly under <host>.
+    """
+    if not os.path.isdir(FACT_CACHE_DIR):
+        return {}
+    names = [name for name in os.listdir(FACT_CACHE_DIR)
+             if name == host or (name.startswith('s') and name.endswith(f"_{host}"))]
+    for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(FACT_CACHE_DIR, name)), reverse=True):
+        try:
+            with open(os.path.join(FACT_CACHE_DIR, name), 'r') as f:
+                cache = json.load(f)
+            if "__payload__" in cache:
+                cache = json.loads(cache["__payload__"])
+            return cache
+        except ValueError:
+            continue
+    return {}
+
+
+def cached_facts(host, spec):
+    """Package and service facts for the spec that the fact cache answers.
+
+    package_facts lists every installed package, so a package missing from it
+    is not installed. Only running services are taken from service_facts, which
+    reports other units too coarsely; the rest are probed live.
+    """
+    if CASSETTE.replaying:
+        try:
+            return CASSETTE.replay("facts", "cache")
+        except CassetteMiss:
+            return {"packages": {}, "services": {}}
+
+    cache = read_fact_cache(host)
+    packages = {}
+    if "packages" in cache:
+        for name in spec.get("packages", []):
+            installed = cache["packages"].get(name)
+            packages[name] = {"status": "install ok installed", "version": installed[0]["version"]} if installed else None
+    services = {}
+    for name in spec.get("services", []):
+        service = cache.get("services", {}).get(f"{name}.service")
+        if service and service.get("state") == "running" and service.get("status") not in (None, "unknown"):
+            services[name] = {"active": "active", "enabled": service["status"]}
+
+    cached = {"packages": packages, "services": services}
+    if CASSETTE.recording:
+        CASSETTE.record("facts", "cache", cached)
+    return cached
+
+
+def gather_facts(transport, host, spec):
+    """Take package and service facts from the fact cache and collect the rest live."""
+    cached = cached_facts(host, spec)
+    live_spec = dict(
+        spec,
+        packages=[name for name in spec.get("packages", []) if name not in cached["packages"]],
+        services=[name for name in spec.get("services", []) if name not in cached["services"]],
+    )
+    facts = collect_facts(transport, live_spec)
+    facts.data["packages"].update(cached["packages"])
+    facts.data["services"].update(cached["services"])
+    total = len(spec.get("packages", [])) + len(spec.get("services", []))
+    print(f"Fact cache answered {len(cached['packages']) + len(cached['services'])} "
+          f"of {total} package and service facts")
+    return facts
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_facts(key_path, user, host, spec):
+    """Return the cached snapshot for a host, collecting it on first use."""
+    key = (key_path, user, host)
+    with _snapshots_lock:
+        if key not in _snapshots:
+            _snapshots[key] = gather_facts(get_transport(key_path, user, host), host, spec)
+        return _snapshots[key]
@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import json
+import os
+
+from facts import collect_facts
+from pool import LEASE_FILE
+from settings import BASELINE_SPEC, RECYCLE
+from transport import get_transport
+
+# Lab-specific routine that undoes everything the playbook may have installed
+CLEANUP_SCRIPT = 'cleanup.sh'
+
+# Places where a submission's root tasks could leave access or a job behind for the next
+# submission, fingerprinted in every lab on top of BASELINE_SPEC. Each runs under sudo
+# and must succeed, so a host that cannot be inspected is never recycled.
+TRUST_COMMANDS = [
+    # Logins: SSH keys of every account, accounts, sudo rights and the sshd config
+    "sudo -n sh -c '{ find /root /home -maxdepth 3 -path \"*/.ssh/*\" -type f -exec sha256sum {} +; "
+    "sha256sum /etc/passwd /etc/shadow /etc/group /etc/sudoers; "
+    "find /etc/sudoers.d /etc/ssh -type f ! -name \"ssh_host_*\" -exec sha256sum {} +; } 2>/dev/null | sort'",
+    # Scheduled jobs
+    "sudo -n sh -c '{ find /etc/crontab /etc/cron.d /etc/cron.hourly /etc/cron.daily /etc/cron.weekly "
+    "/etc/cron.monthly /var/spool/cron -type f -exec sha256sum {} +; } 2>/dev/null | sort'",
+    # Boot and login hooks: systemd units and links, init scripts, profile scripts, preloads
+    "sudo -n sh -c '{ find /etc/systemd /usr/lib/systemd/system /etc/init.d -type l -printf \"%p -> %l\\n\"; "
+    "find /etc/systemd /usr/lib/systemd/system /etc/init.d /etc/rc.local /etc/profile.d /etc/ld.so.preload "
+    "-type f -exec sha256sum {} +; } 2>/dev/null | sort'",
+    # setuid binaries
+    "sudo -n sh -c 'find / -xdev -perm -4000 -type f 2>/dev/null | sort'",
+]
+
+
+def host_transport(host):
+    return get_transport(host["key_file"], 'ubuntu', host["public_ip"])
+
+
+def fingerprint(transport):
+    """Hash the BASELINE_SPEC facts and TRUST_COMMANDS output of a host into one comparable digest."""
+    spec = dict(BASELINE_SPEC, commands=BASELINE_SPEC.get("commands", []) + TRUST_COMMANDS)
+    facts = collect_facts(transport, spec)
+    for command in TRUST_COMMANDS:
+        out, err = facts.command(command)
+        if out is None:
+            raise RuntimeError(f"Could not inspect the host as root: {err}")
+    return hashlib.sha256(json.dumps(facts.data, sort_keys=True).encode()).hexdigest()
+
+
+def record_baseline():
+    """Fingerprint a freshly leased pool host before the playbook changes it."""
+    if not RECYCLE or not os.path.exists(LEASE_FILE):
+        return
+    with open(LEASE_FILE, 'r') as f:
+        lease = json.load(f)
+    if "baseline" in lease["host"]:
+        return
+    try:
+        lease["host"]["baseline"] = fingerprint(host_transport(lease["host"]))
+    except Exception as e:
+        # Without a baseline the host is destroyed on reset instead of recycled
+        print(f"Could not fingerprint the leased host: {e}")
+        return
+    with open(LEASE_FILE, 'w') as f:
+        json.dump(lease, f, indent=4)
+
+
+def recycle_host(host):
+    """Run the cleanup routine and check the host is back to its baseline fingerprint."""
+    if "baseline" not in host:
+        return False, "no baseline fingerprint was recorded"
+    transport = host_transport(host)
+
+    with open(CLEANUP_SCRIPT, 'r') as f:
+        encoded = base64.b64encode(f.read().encode()).decode()
+    out, err = transport.run(f"echo {encoded} | base64 -d | sudo bash")
+    if out is None:
+        return False, f"cleanup failed: {err}"
+
+    if fingerprint(transport) != host["baseline"]:
+        return False, "host facts differ from the baseline after cleanup"
+    return True, "host is back to baseline"
@@ -1,17 +1,44 @@
+import json
 import os
-import re
 import subprocess
 import shutil
 
-def reset_environment():
+from pool import LEASE_FILE, open_pool
+from recycle import recycle_host
+from settings import RECYCLE
+from tfcache import terraform_env, terraform_init
+from transport import close_transports
+
+def release_lease():
+    """Hand the leased pool host back and let the pool refill in the background"""
+    with open(LEASE_FILE, 'r') as f:
+        lease = json.load(f)
+    with open('data.json', 'r') as f:
+        credentials = json.load(f)
+
+    pool = open_pool(credentials)
+    recycled = pool.release(lease["host"], recycle_host if RECYCLE else None)
+    pool.refill_async(credentials)
+    action = "Recycled" if recycled else "Released"
+    print(f"{action} pool host {lease['host']['id']}")
+
+def destroy_infrastructure():
+    """Destroy the per-submission Terraform infrastructure"""
+    with open('data.json', 'r') as f:
+        credentials = json.load(f)
+
     # Store original working directory
     original_dir = os.getcwd()
     
     try:
         # Destroy Terraform infrastructure
         os.chdir('terraform')
-        subprocess.run(["terraform", "init"], check=True)
-        destroy_process = subprocess.run(["terraform", "destroy", "-auto-approve"], capture_output=True, text=True)
+        if not os.path.exists('terraform.tfstate'):
+            # Nothing was applied, and destroy would prompt for the shared variables
+            return True
+        terraform_init('.')
+        destroy_process = subprocess.run(["terraform", "destroy", "-auto-approve"], capture_output=True, text=True,
+                                         env=terraform_env(credentials))
         
         if destroy_process.returncode != 0:
             print("Error during Terraform destroy:")
@@ -20,9 +47,23 @@ def reset_environment():
     finally:
         os.chdir(original_dir)
 
+    return True
+
+def reset_environment():
+    if os.path.exists(LEASE_FILE):
+        try:
+            release_lease()
+        finally:
+            close_transports()
+    elif not destroy_infrastructure():
+        return False
+
     # Clean up generated files
     generated_files = [
         ('inventory', 'ansible.pem'),
+        ('inventory', 'lease.json'),
+        ('inventory', 'readiness.json'),
+        ('inventory', 'playbook_profile.json'),
     ]
 
     for folder, filename in generated_files:
@@ -31,6 +72,12 @@ def reset_environment():
             os.remove(file_path)
             print(f"Removed: {file_path}")
 
+    # The tuned ansible.cfg and its fact cache belong to this submission only
+    if os.path.exists('ansible.tuned.cfg'):
+        os.remove('ansible.tuned.cfg')
+        print("Removed: ansible.tuned.cfg")
+    shutil.rmtree(os.path.join('inventory', 'fact_cache'), ignore_errors=True)
+
     # Reset inventory file
     inventory_content = """[appserver]
 <public-ip> ansible_user=ubuntu ansible_ssh_private_key_file=inventory/ansible.pem
@@ -39,33 +86,11 @@ def reset_environment():
         f.write(inventory_content)
     print("Reset inventory.ini to initial state")
 
-    # Restore main.tf credentials to placeholders
-    main_tf_path = os.path.join('terraform', 'main.tf')
-    with open(main_tf_path, 'r') as f:
-        content = f.read()
-
-    # Use regex to replace credentials
-    content = re.sub(
-        r'access_key\s*=\s*"[^"]*"',
-        'access_key = "<Replace with Instructor Access key ID>"',
-        content
-    )
-    content = re.sub(
-        r'secret_key\s*=\s*"[^"]*"',
-        'secret_key = "<Replace with Instructor Secret access key>"',
-        content
-    )
-
-    with open(main_tf_path, 'w') as f:
-        f.write(content)
-    print("Restored main.tf to initial configuration")
-
-    # Clean Terraform state files
+    # Clean Terraform state files; .terraform and the lock file stay so the next init is skipped
     terraform_files = [
         'terraform.tfstate',
         'terraform.tfstate.backup',
-        '.terraform.lock.hcl',
-        '.terraform'
+        'shared.auto.tfvars.json'
     ]
     
     for file in terraform_files:
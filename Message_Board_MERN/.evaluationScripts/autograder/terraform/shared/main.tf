@@ -0,0 +1,91 @@
+# Instructor credentials, passed by the grader as TF_VAR_access_key and TF_VAR_secret_key
+variable "access_key" {
+  type      = string
+  sensitive = true
+}
+
+variable "secret_key" {
+  type      = string
+  sensitive = true
+}
+
+provider "aws" {
+  access_key = var.access_key
+  secret_key = var.secret_key
+  region     = "us-east-1"
+}
+
+# Created once per lab and account, then reused by every submission's instance
+
+variable "key_pool_size" {
+  type    = number
+  default = 4
+}
+
+# Generate random suffix
+resource "random_id" "suffix" {
+  byte_length = 4
+}
+
+# Generate a pool of SSH key pairs
+resource "tls_private_key" "instance_key" {
+  count     = var.key_pool_size
+  algorithm = "RSA"
+  rsa_bits  = 4096
+}
+
+# Create AWS key pairs
+resource "aws_key_pair" "instance_key" {
+  count      = var.key_pool_size
+  key_name   = "instance-key-${random_id.suffix.hex}-${count.index}"
+  public_key = tls_private_key.instance_key[count.index].public_key_openssh
+}
+
+# Save private keys to local files
+resource "local_file" "private_key" {
+  count           = var.key_pool_size
+  content         = tls_private_key.instance_key[count.index].private_key_pem
+  filename        = "${path.module}/instance-key-${random_id.suffix.hex}-${count.index}.pem"
+  file_permission = "0600"
+}
+
+# Security group configuration
+resource "aws_security_group" "web_sg" {
+  name        = "web-sg-${random_id.suffix.hex}"
+  description = "Allow SSH, HTTP"
+
+  ingress {
+    description = "SSH"
+    from_port   = 22
+    to_port     = 22
+    protocol    = "tcp"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+
+  ingress {
+    description = "HTTP"
+    from_port   = 80
+    to_port     = 80
+    protocol    = "tcp"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+}
+
+output "security_group_name" {
+  value = aws_security_group.web_sg.name
+}
+
+output "key_names" {
+  value = aws_key_pair.instance_key[*].key_name
+}
+
+output "private_key_files" {
+  value = local_file.private_key[*].filename
+}
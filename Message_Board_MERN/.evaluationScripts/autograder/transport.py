@@ -0,0 +1,418 @@
+import base64
+import itertools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from cassette import CASSETTE, command_key
+from target import SSH_OPTIONS
+
+# ssh exits with 255 when the connection itself fails
+SSH_CONNECTION_ERROR = 255
+
+# How long an idle ControlMaster connection outlives its last client
+CONTROL_PERSIST = os.environ.get("GRADER_SSH_CONTROL_PERSIST", "600")
+
+
+# Remote side of the agent protocol, sent base64-encoded whenever the agent is started
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agent.py'), 'r') as f:
+    AGENT_SOURCE = f.read()
+
+# How long the agent gets to announce itself before plain ssh commands are used instead
+AGENT_START_TIMEOUT = 15
+
+# How long the agent gets to exit once its stdin is closed
+AGENT_STOP_TIMEOUT = 5
+
+
+class HostUnreachable(Exception):
+    """Raised for every remote command once SSH to a host has failed."""
+
+
+class AgentError(Exception):
+    """Raised when the agent cannot answer a request."""
+
+
+def agent_command(*args):
+    encoded = base64.b64encode(AGENT_SOURCE.encode()).decode()
+    return " ".join([f'python3 -u -c "import base64; exec(base64.b64decode(\'{encoded}\'))"', *args])
+
+
+def agent_requests(calls):
+    """Turn (method, *params) tuples into numbered JSON-RPC requests."""
+    return [{"jsonrpc": "2.0", "id": index, "method": call[0], "params": list(call[1:])}
+            for index, call in enumerate(calls)]
+
+
+class SSHTransport:
+    """Start a new ssh process (and handshake) for every command."""
+
+    name = "plain"
+
+    def __init__(self, key_path, user, host):
+        self.key_path = key_path
+        self.user = user
+        self.host = host
+        self.calls = 0
+        self.elapsed = 0.0
+        self.stats_lock = threading.Lock()
+        self.unreachable = None
+
+    def mark_unreachable(self, err):
+        self.unreachable = f"SSH connection to {self.host} failed: {err}"
+
+    def check_reachable(self):
+        """Short-circuit without contacting the host once a connection attempt has failed."""
+        if self.unreachable:
+            raise HostUnreachable(self.unreachable)
+
+    def record_call(self, start):
+        with self.stats_lock:
+            self.calls += 1
+            self.elapsed += time.monotonic() - start
+
+    def ssh_argv(self, *options):
+        return ["ssh", "-i", self.key_path, *SSH_OPTIONS, *options, f"{self.user}@{self.host}"]
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def run(self, command):
+        """Execute a command on the host and return (stdout, err), recording it if asked to."""
+        if not CASSETTE.recording:
+            return self.execute(command)
+        try:
+            out, err = self.execute(command)
+        except HostUnreachable as e:
+            CASSETTE.record("ssh", command_key(command), {"unreachable": str(e)})
+            raise
+        CASSETTE.record("ssh", command_key(command), {"out": out, "err": err})
+        return out, err
+
+    def still_reachable(self):
+        """Tell a lost connection from a remote command that itself exited with 255."""
+        start = time.monotonic()
+        try:
+            probe = subprocess.run(self.ssh_argv() + ["true"], capture_output=True, text=True)
+        finally:
+            self.record_call(start)
+        return probe.returncode == 0
+
+    def execute(self, command):
+        self.check_reachable()
+        start = time.monotonic()
+        try:
+            result = subprocess.run(self.ssh_argv() + [command], capture_output=True, text=True)
+        finally:
+            self.record_call(start)
+        if result.returncode == SSH_CONNECTION_ERROR and not self.still_reachable():
+            self.mark_unreachable(result.stderr.strip())
+            self.check_reachable()
+        if result.returncode != 0:
+            return None, f"Error: {result.stderr.strip()}"
+        return result.stdout.strip(), None
+
+    def batch(self, calls):
+        """Answer agent calls, given as (method, *params) tuples, in one round trip."""
+        requests = agent_requests(calls)
+        if not CASSETTE.recording:
+            replies = self.call_agent(requests)
+        else:
+            key = command_key(json.dumps(requests, sort_keys=True))
+            try:
+                replies = self.call_agent(requests)
+            except HostUnreachable as e:
+                CASSETTE.record("agent", key, {"unreachable": str(e)})
+                raise
+            CASSETTE.record("agent", key, {"replies": replies})
+        results = []
+        for call, reply in zip(calls, replies):
+            if "error" in reply:
+                raise AgentError(f"Agent {call[0]} failed on {self.host}: {reply['error']['message']}")
+            results.append(reply["result"])
+        return results
+
+    def call_agent(self, requests):
+        """Run the agent once for the batch as an ordinary remote command."""
+        encoded = base64.b64encode(json.dumps(requests).encode()).decode()
+        out, err = self.execute(agent_command(encoded))
+        if out is None:
+            raise AgentError(f"Agent batch failed on {self.host}: {err}")
+        return json.loads(out)
+
+    def saved_seconds(self):
+        return 0.0
+
+
+class MultiplexedSSHTransport(SSHTransport):
+    """Keep one authenticated ControlMaster session open and run every command over it."""
+
+    name = "multiplex"
+
+    def __init__(self, key_path, user, host):
+        super().__init__(key_path, user, host)
+        self.control_dir = None
+        self.handshake = None
+
+    def control_options(self):
+        return ["-o", f"ControlPath={os.path.join(self.control_dir, '%C')}"]
+
+    def master_argv(self, *options):
+        return SSHTransport.ssh_argv(self, *self.control_options(), *options)
+
+    def open(self):
+        """Authenticate once and leave the master connection in the background."""
+        self.control_dir = tempfile.mkdtemp(prefix="ag-ssh-")
+        argv = self.master_argv(
+            "-o", "ControlMaster=yes",
+            "-o", f"ControlPersist={CONTROL_PERSIST}",
+            "-f", "-N"
+        )
+        start = time.monotonic()
+        # The backgrounded master may keep inherited pipes open, so never capture its output
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            returncode = subprocess.call(argv, stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL, stderr=stderr)
+            if returncode != 0:
+                stderr.seek(0)
+                self.mark_unreachable(stderr.read().strip())
+                return
+        self.handshake = time.monotonic() - start
+
+    def close(self):
+        if self.control_dir is None:
+            return
+        if self.handshake is not None:
+            subprocess.call(self.master_argv("-O", "exit"),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+        self.control_dir = None
+
+    def ssh_argv(self, *options):
+        # Falls back to a direct connection if the master is gone
+        return super().ssh_argv(*self.control_options(), "-o", "ControlMaster=no", *options)
+
+    def saved_seconds(self):
+        """Estimate handshake time avoided: every call but the first would have paid it."""
+        if self.handshake is None or self.calls == 0:
+            return 0.0
+        return self.handshake * (self.calls - 1)
+
+
+class AgentTransport(MultiplexedSSHTransport):
+    """Start agent.py on the host once and send every request over its stdin/stdout.
+
+    The ControlMaster session is kept for the agent's own connection. Each
+    request gets an id unique to the connection and the agent answers every
+    batch in a thread of its own, so concurrent checks share the agent without
+    waiting for each other; a reader thread hands each reply to the call that
+    sent its id. If the agent does not start within AGENT_START_TIMEOUT,
+    requests fall back to multiplexed ssh commands.
+    """
+
+    name = "agent"
+
+    def __init__(self, key_path, user, host):
+        super().__init__(key_path, user, host)
+        self.process = None
+        self.reader = None
+        self.started = threading.Event()
+        self.ready = False
+        self.stopping = False
+        self.write_lock = threading.Lock()
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.lost = None
+
+    def open(self):
+        super().open()
+        if self.unreachable:
+            return
+        self.process = subprocess.Popen(
+            self.ssh_argv() + [agent_command()],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.reader = threading.Thread(target=self.read_replies, daemon=True)
+        self.reader.start()
+        if not self.started.wait(AGENT_START_TIMEOUT) or not self.ready:
+            print(f"Probe agent did not start on {self.host}, falling back to one ssh command per request")
+            self.stop_agent(timeout=0)
+
+    def read_replies(self):
+        """Hand every reply to the call waiting for its id, until the agent's output ends."""
+        error = "probe agent connection closed"
+        try:
+            for line in self.process.stdout:
+                message = json.loads(line)
+                if message.get("method") == "ready":
+                    self.ready = True
+                    self.started.set()
+                    continue
+                with self.pending_lock:
+                    replies = self.pending.pop(message.get("id"), None)
+                if replies is not None:
+                    replies.put(message)
+        except (OSError, ValueError) as e:
+            error = f"probe agent connection lost ({e})"
+        finally:
+            self.started.set()
+            self.fail_pending(error)
+
+    def fail_pending(self, error):
+        """Wake every waiting call once no more replies can come."""
+        with self.pending_lock:
+            self.lost = error
+            waiting = {id(replies): replies for replies in self.pending.values()}
+            self.pending.clear()
+        if self.ready and not self.stopping:
+            self.mark_unreachable(error)
+        for replies in waiting.values():
+            replies.put(None)
+
+    def stop_agent(self, timeout=AGENT_STOP_TIMEOUT):
+        if self.process is None:
+            return
+        self.stopping = True
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.reader.join(AGENT_STOP_TIMEOUT)
+        self.process = None
+
+    def close(self):
+        self.stop_agent()
+        super().close()
+
+    def call_agent(self, requests):
+        if self.process is None:
+            return super().call_agent(requests)
+        self.check_reachable()
+        start = time.monotonic()
+        replies = queue.Queue()
+        with self.pending_lock:
+            if self.lost:
+                self.record_call(start)
+                self.mark_unreachable(self.lost)
+                raise HostUnreachable(self.unreachable)
+            tagged = [dict(request, id=next(self.request_ids)) for request in requests]
+            for request in tagged:
+                self.pending[request["id"]] = replies
+        try:
+            with self.write_lock:
+                self.process.stdin.write(json.dumps(tagged) + "\n")
+                self.process.stdin.flush()
+            answers = {}
+            while len(answers) < len(tagged):
+                reply = replies.get()
+                if reply is None:
+                    raise HostUnreachable(self.unreachable or self.lost)
+                answers[reply["id"]] = reply
+        except OSError as e:
+            self.mark_unreachable(f"probe agent connection lost ({e})")
+            raise HostUnreachable(self.unreachable)
+        finally:
+            with self.pending_lock:
+                for request in tagged:
+                    self.pending.pop(request["id"], None)
+            self.record_call(start)
+        # Callers and the cassette see the ids they sent
+        return [dict(answers[sent["id"]], id=request["id"]) for sent, request in zip(tagged, requests)]
+
+    def execute(self, command):
+        if self.process is None:
+            return super().execute(command)
+        reply, = self.call_agent(agent_requests([("exec", command)]))
+        if "error" in reply:
+            raise AgentError(f"Agent exec failed on {self.host}: {reply['error']['message']}")
+        result = reply["result"]
+        if result["rc"] != 0:
+            return None, f"Error: {result['stderr']}"
+        return result["stdout"], None
+
+
+class ReplayTransport(SSHTransport):
+    """Serve command results from the cassette without contacting any host."""
+
+    name = "replay"
+
+    def call_agent(self, requests):
+        start = time.monotonic()
+        try:
+            result = CASSETTE.replay("agent", command_key(json.dumps(requests, sort_keys=True)))
+        finally:
+            self.record_call(start)
+        if "unreachable" in result:
+            raise HostUnreachable(result["unreachable"])
+        return result["replies"]
+
+    def execute(self, command):
+        start = time.monotonic()
+        try:
+            result = CASSETTE.replay("ssh", command_key(command))
+        finally:
+            self.record_call(start)
+        if "unreachable" in result:
+            raise HostUnreachable(result["unreachable"])
+        return result["out"], result["err"]
+
+
+TRANSPORTS = {
+    SSHTransport.name: SSHTransport,
+    MultiplexedSSHTransport.name: MultiplexedSSHTransport,
+    AgentTransport.name: AgentTransport,
+    ReplayTransport.name: ReplayTransport,
+}
+
+TRANSPORT_MODE = os.environ.get("GRADER_SSH_TRANSPORT", AgentTransport.name)
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(key_path, user, host):
+    """Return the open transport for a host, creating it on first use."""
+    key = (key_path, user, host)
+    with _transports_lock:
+        if key in _transports:
+            return _transports[key]
+        mode = ReplayTransport.name if CASSETTE.replaying else TRANSPORT_MODE
+        if mode not in TRANSPORTS:
+            raise ValueError(f"Unknown SSH transport '{mode}'")
+        transport = TRANSPORTS[mode](key_path, user, host)
+        transport.open()
+        _transports[key] = transport
+        return transport
+
+
+def close_transports():
+    """Shut down every open transport."""
+    for transport in _transports.values():
+        transport.close()
+
+
+def transport_summary():
+    """Describe remote command counts, time spent and handshake time saved."""
+    lines = []
+    for transport in _transports.values():
+        lines.append(
+            f"SSH transport ({transport.name}) to {transport.host}: "
+            f"{transport.calls} commands in {transport.elapsed:.2f}s, "
+            f"~{transport.saved_seconds():.2f}s of handshakes saved"
+        )
+    return "\n".join(lines)
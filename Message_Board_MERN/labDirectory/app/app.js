@@ -1,28 +1,73 @@
 const express = require('express');
 const bodyParser = require('body-parser');
-const { MongoClient } = require('mongodb');
+const { MongoClient, ObjectId } = require('mongodb');
 
 const app = express();
-const PORT = 5000;
+const PORT = process.env.PORT || 5000;
 const DB_NAME = 'messageDB';
 const DB_URL = 'mongodb://localhost:27017';
+const PAGE_SIZE = 20;
+const MAX_PAGE_SIZE = 100;
 
 app.use(bodyParser.json());
 
+// Tells which worker answered when several run behind nginx
+app.use((req, res, next) => {
+  res.set('X-Worker-Port', String(PORT));
+  next();
+});
+
 // Connect to MongoDB
 let db;
 async function connectDB() {
   const client = new MongoClient(DB_URL);
   await client.connect();
   db = client.db(DB_NAME);
+  // Serves the newest-first pages below without an in-memory sort
+  await db.collection('messages').createIndex({ createdAt: -1, _id: -1 });
   console.log('Connected to MongoDB');
 }
 connectDB();
 
+// A cursor is the createdAt time and _id of the last message of a page
+function encodeCursor(message) {
+  return `${message.createdAt.getTime()}_${message._id}`;
+}
+
+function decodeCursor(cursor) {
+  const [time, id] = cursor.split('_');
+  if (!/^\d+$/.test(time) || !ObjectId.isValid(id)) {
+    throw new Error('Invalid cursor');
+  }
+  return { createdAt: new Date(Number(time)), _id: new ObjectId(id) };
+}
+
 // Routes
+// Returns one page of messages, newest first; X-Next-Cursor is set when older ones remain
 app.get('/api/messages', async (req, res) => {
+  // A missing, non-numeric or non-positive limit gets the default page size
+  const requested = parseInt(req.query.limit, 10);
+  const limit = requested > 0 ? Math.min(requested, MAX_PAGE_SIZE) : PAGE_SIZE;
+  let filter = {};
+  if (req.query.before) {
+    try {
+      const { createdAt, _id } = decodeCursor(req.query.before);
+      filter = { $or: [{ createdAt: { $lt: createdAt } }, { createdAt, _id: { $lt: _id } }] };
+    } catch (err) {
+      return res.status(400).send(err.message);
+    }
+  }
+
   try {
-    const messages = await db.collection('messages').find().toArray();
+    const messages = await db.collection('messages')
+      .find(filter)
+      .sort({ createdAt: -1, _id: -1 })
+      .limit(limit + 1)
+      .toArray();
+    if (messages.length > limit) {
+      messages.pop();
+      res.set('X-Next-Cursor', encodeCursor(messages[messages.length - 1]));
+    }
     res.json(messages);
   } catch (err) {
     res.status(500).send(err.message);
@@ -32,19 +77,11 @@ app.get('/api/messages', async (req, res) => {
 app.post('/api/messages', async (req, res) => {
   try {
     const { title, description, username } = req.body;
-    const result = await db.collection('messages').insertOne({
-      title,
-      description,
-      username,
-      createdAt: new Date()
-    });
-
-    // Get the inserted document using the insertedId
-    const insertedDoc = await db.collection('messages').findOne({
-      _id: result.insertedId
-    });
-
-    res.status(201).json(insertedDoc);  // Send the found document
+    const message = { title, description, username, createdAt: new Date() };
+    const result = await db.collection('messages').insertOne(message);
+
+    // The stored document is exactly what was sent plus its new _id
+    res.status(201).json({ _id: result.insertedId, ...message });
   } catch (err) {
     res.status(400).send(err.message);
   }
@@ -2,6 +2,8 @@ import React, { useState, useEffect } from 'react';
 
 function App() {
   const [messages, setMessages] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
   const [formData, setFormData] = useState({
     title: '',
     description: '',
@@ -12,20 +14,31 @@ function App() {
     fetchMessages();
   }, []);
 
-  const fetchMessages = async () => {
-    const response = await fetch('/api/messages');
-    const data = await response.json();
-    setMessages(data);
+  // Loads one page, newest first; with a cursor it appends the next older page
+  const fetchMessages = async (cursor) => {
+    setLoading(true);
+    try {
+      const query = cursor ? `?before=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`/api/messages${query}`);
+      const data = await response.json();
+      setMessages(previous => (cursor ? [...previous, ...data] : data));
+      setNextCursor(response.headers.get('X-Next-Cursor'));
+    } finally {
+      setLoading(false);
+    }
   };
 
   const handleSubmit = async (e) => {
     e.preventDefault();
-    await fetch('/api/messages', {
+    const response = await fetch('/api/messages', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(formData)
     });
-    fetchMessages();
+    if (response.ok) {
+      const message = await response.json();
+      setMessages(previous => [message, ...previous]);
+    }
     setFormData({ title: '', description: '', username: '' });
   };
 
@@ -104,6 +117,26 @@ function App() {
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <button
+          onClick={() => fetchMessages(nextCursor)}
+          disabled={loading}
+          style={{
+            display: 'block',
+            margin: '20px auto 0',
+            padding: '10px 20px',
+            background: '#ecf0f1',
+            color: '#2c3e50',
+            border: '1px solid #bdc3c7',
+            borderRadius: '4px',
+            cursor: 'pointer',
+            fontSize: '16px'
+          }}
+        >
+          {loading ? 'Loading...' : 'Load older messages'}
+        </button>
+      )}
     </div>
   );
 }
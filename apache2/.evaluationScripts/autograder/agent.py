@@ -0,0 +1,182 @@
+# Probe agent pushed to the target host by transport.py and run with its
+# system python3. Without arguments it serves JSON-RPC requests from stdin,
+# one JSON array of requests per line, and streams one reply per line back.
+# Every line is answered in a thread of its own, so replies to different lines
+# can interleave; the caller matches them to its requests by id.
+# With a base64 JSON array as argument it answers that batch once and exits.
+import base64
+import grp
+import hashlib
+import json
+import os
+import pwd
+import stat
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+READ_LIMIT = 1048576
+
+
+def run(command):
+    result = subprocess.run(command, shell=True, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    return {"rc": result.returncode, "stdout": result.stdout.strip(), "stderr": result.stderr.strip()}
+
+
+def name(lookup, ident):
+    try:
+        return lookup(ident)[0]
+    except KeyError:
+        return str(ident)
+
+
+def kind(mode):
+    if stat.S_ISLNK(mode):
+        return "symbolic link"
+    if stat.S_ISDIR(mode):
+        return "directory"
+    if stat.S_ISREG(mode):
+        return "regular file"
+    return "other"
+
+
+def path_stat(path):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return {"lexists": False, "exists": False}
+    facts = {
+        "lexists": True,
+        "kind": kind(st.st_mode),
+        "owner": name(pwd.getpwuid, st.st_uid),
+        "group": name(grp.getgrgid, st.st_gid),
+        "mode": format(stat.S_IMODE(st.st_mode), "o"),
+    }
+    if stat.S_ISLNK(st.st_mode):
+        facts["target"] = os.readlink(path)
+    try:
+        facts["type"] = kind(os.stat(path).st_mode)
+        facts["exists"] = True
+    except OSError:
+        facts["exists"] = False
+    return facts
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def read_file(path, limit=READ_LIMIT):
+    try:
+        with open(path, errors="replace") as f:
+            return f.read(limit)
+    except OSError:
+        return None
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def manifest(root):
+    """Hash every file under root and fold the digests into a Merkle tree, one node per directory."""
+    if not os.path.isdir(root):
+        return None
+    files = {}
+
+    def tree(directory):
+        entries = []
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            if os.path.isdir(path) and not os.path.islink(path):
+                entries.append("d %s %s" % (entry, tree(path)))
+            elif os.path.isfile(path):
+                digest = sha256(path)
+                files[os.path.relpath(path, root)] = digest
+                entries.append("f %s %s" % (entry, digest))
+        return hashlib.sha256("\n".join(entries).encode()).hexdigest()
+
+    return {"root": tree(root), "files": files}
+
+
+def systemctl(service):
+    return {
+        "active": run("systemctl is-active " + service)["stdout"] or None,
+        "enabled": run("systemctl is-enabled " + service)["stdout"] or None,
+    }
+
+
+def dpkg_query(package):
+    result = run("dpkg-query -W -f='${Status}\t${Version}' " + package)
+    if result["rc"] != 0 or "\t" not in result["stdout"]:
+        return None
+    status, version = result["stdout"].split("\t", 1)
+    return {"status": status, "version": version}
+
+
+def http_get_local(port, path="/", headers=None, timeout=5):
+    request = urllib.request.Request("http://127.0.0.1:%d%s" % (port, path), headers=headers or {})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        response = e
+    except (OSError, ValueError) as e:
+        return {"error": str(e)}
+    with response:
+        body = response.read(READ_LIMIT).decode("utf-8", "replace")
+        return {"status": response.getcode(), "headers": dict(response.headers.items()), "body": body}
+
+
+METHODS = {
+    "exec": run,
+    "stat": path_stat,
+    "exists": exists,
+    "read_file": read_file,
+    "sha256": sha256,
+    "manifest": manifest,
+    "systemctl": systemctl,
+    "dpkg_query": dpkg_query,
+    "http_get_local": http_get_local,
+}
+
+
+def handle(request):
+    reply = {"jsonrpc": "2.0", "id": request.get("id")}
+    try:
+        reply["result"] = METHODS[request["method"]](*request.get("params", []))
+    except Exception as e:
+        reply["error"] = {"code": -32000, "message": "%s: %s" % (type(e).__name__, e)}
+    return reply
+
+
+def serve():
+    output = threading.Lock()
+
+    def answer(line):
+        for request in json.loads(line):
+            reply = json.dumps(handle(request)) + "\n"
+            with output:
+                sys.stdout.write(reply)
+                sys.stdout.flush()
+
+    sys.stdout.write(json.dumps({"jsonrpc": "2.0", "method": "ready", "params": sorted(METHODS)}) + "\n")
+    sys.stdout.flush()
+    for line in sys.stdin:
+        threading.Thread(target=answer, args=(line,)).start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(json.dumps([handle(request) for request in json.loads(base64.b64decode(sys.argv[1]))]))
+    else:
+        serve()
@@ -1,54 +1,24 @@
 import json
 import os
-import subprocess
-import requests
-import configparser
+from target import parse_inventory
+from transport import HostUnreachable, get_transport, close_transports, transport_summary
+from facts import get_facts
+from runner import run_test_cases
+from settings import EXECUTOR, MAX_WORKERS
+from recycle import record_baseline
+from playbook import FACTS_PLAYBOOK, run_playbook, playbook_profile
+from cassette import CASSETTE, http_get, save_cassette
 
-def execute_command(command):
-    """Execute a shell command and return the output and error."""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            executable='/bin/bash'
-        )
-        return result.stdout.strip(), None
-    except subprocess.CalledProcessError as e:
-        return None, f"Error: {e.stderr.strip()}"
-
-def parse_inventory():
-    """Parse inventory.ini to get EC2 connection details"""
-    config = configparser.ConfigParser(allow_no_value=True)
-    config.read('inventory/inventory.ini')
-    
-    ec2_host = None
-    user = 'ubuntu'
-    key_path = 'inventory/ansible.pem'
-    
-    if 'apacheserver' in config:
-        for host in config['apacheserver']:
-            parts = host.split()
-            if parts:
-                ec2_host = parts[0]
-                for param in parts[1:]:
-                    if param.startswith('ansible_user='):
-                        user = param.split('=')[1]
-                    elif param.startswith('ansible_ssh_private_key_file='):
-                        key_path = param.split('=')[1]
-                break
-    
-    if not ec2_host:
-        raise ValueError("EC2 host not found in inventory.ini under [apacheserver] group.")
-    
-    return ec2_host, user, key_path
+# Everything the checks inspect, collected from the host in one round trip
+FACT_SPEC = {
+    "paths": ["/var/www/html/index.html"],
+    "services": ["apache2"],
+    "commands": ["apache2 -v"],
+}
 
 def run_remote_command(command, key_path, user, host):
-    """Execute a command on the EC2 instance via SSH"""
-    ssh_cmd = f"ssh -i {key_path} -o StrictHostKeyChecking=no {user}@{host} '{command}'"
-    return execute_command(ssh_cmd)
+    """Execute a command on the EC2 instance over the shared SSH transport"""
+    return get_transport(key_path, user, host).run(command)
 
 def verify_inventory_config(key_path, user, host):
     """Verify SSH connectivity using inventory details."""
@@ -58,34 +28,39 @@ def verify_inventory_config(key_path, user, host):
     else:
         return False, f"SSH connection failed: {err or 'Unknown error'}"
 
+def host_facts(key_path, user, host):
+    """Return the fact snapshot of the EC2 instance"""
+    return get_facts(key_path, user, host, FACT_SPEC)
+
 def verify_apache_installed(key_path, user, host):
     """Check if Apache2 is installed."""
-    out, err = run_remote_command("apache2 -v", key_path, user, host)
+    out, err = host_facts(key_path, user, host).command("apache2 -v")
     if out and 'Apache/2' in out:
         return True, f"Apache2 installed: {out.splitlines()[0]}"
     return False, "Apache2 is not installed."
 
 def verify_apache_service(key_path, user, host):
     """Check if Apache2 service is active."""
-    out, err = run_remote_command("systemctl is-active apache2", key_path, user, host)
+    out = host_facts(key_path, user, host).service("apache2")["active"]
     if out == 'active':
         return True, "Apache2 service is running."
     return False, f"Apache2 service is not active. Status: {out}"
 
 def verify_index_html(key_path, user, host):
     """Verify index.html is correctly deployed."""
+    facts = host_facts(key_path, user, host)
+
     # Check file exists
-    out, err = run_remote_command("[ -f /var/www/html/index.html ] && echo exists", key_path, user, host)
-    if out != 'exists':
+    if not facts.test('-f', '/var/www/html/index.html'):
         return False, "index.html not found in /var/www/html/."
     
     # Check ownership
-    out, err = run_remote_command("stat -c '%U:%G' /var/www/html/index.html", key_path, user, host)
+    out = facts.stat('/var/www/html/index.html', '%U:%G')
     if out != 'ubuntu:ubuntu':
         return False, f"Incorrect ownership: {out}. Expected ubuntu:ubuntu."
     
     # Check permissions
-    out, err = run_remote_command("stat -c '%a' /var/www/html/index.html", key_path, user, host)
+    out = facts.stat('/var/www/html/index.html', '%a')
     if out != '644':
         return False, f"Incorrect permissions: {out}. Expected 644."
     
@@ -94,7 +69,7 @@ def verify_index_html(key_path, user, host):
 def verify_website_content(host):
     """Check if website serves the correct content."""
     try:
-        response = requests.get(f"http://{host}", timeout=5)
+        response = http_get(f"http://{host}", timeout=5)
         if response.status_code != 200:
             return False, f"HTTP status code {response.status_code} received."
         content = response.text
@@ -105,9 +80,35 @@ def verify_website_content(host):
     except Exception as e:
         return False, f"Failed to access website: {str(e)}"
 
+def run_test(test, prerequisite=None):
+    """Run one test case and build its evaluate.json entry"""
+    test_result = {
+        "testid": test["testid"],
+        "status": "failure",
+        "score": 0,
+        "maximum marks": test["maximum_marks"],
+        "message": ""
+    }
+
+    if prerequisite:
+        test_result["message"] = f"Skipped: prerequisite '{prerequisite}' failed"
+        return test_result
+
+    try:
+        success, message = test["verify_function"](*test["args"])
+        if success:
+            test_result["status"] = "success"
+            test_result["score"] = test["maximum_marks"]
+        test_result["message"] = message
+    except HostUnreachable as e:
+        test_result["message"] = str(e)
+    except Exception as e:
+        test_result["message"] = f"Verification error: {str(e)}"
+
+    return test_result
+
 def main():
     overall = {"data": []}
-    data = []
     
     try:
         ec2_host, user, key_path = parse_inventory()
@@ -124,9 +125,17 @@ def main():
             json.dump(overall, f, indent=4)
         return
 
+    record_baseline()
+
     # Run Ansible playbook first
-    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml"
-    pb_out, pb_err = execute_command(playbook_cmd)
+    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml {FACTS_PLAYBOOK}"
+    profile = None
+    if not CASSETTE.replaying:
+        returncode, tail, run = run_playbook(playbook_cmd)
+        if returncode != 0:
+            print(f"ansible-playbook exited with {returncode}, last lines of output:")
+            print("\n".join(tail))
+        profile = playbook_profile(run)
     
     test_cases = [
         {
@@ -139,54 +148,47 @@ def main():
             "testid": "Apache2 Installation",
             "verify_function": verify_apache_installed,
             "args": (key_path, user, ec2_host),
+            "requires": ["Inventory Configuration"],
             "maximum_marks": 1
         },
         {
             "testid": "Apache Service Running",
             "verify_function": verify_apache_service,
             "args": (key_path, user, ec2_host),
+            "requires": ["Inventory Configuration"],
             "maximum_marks": 1
         },
         {
             "testid": "index.html Deployment",
             "verify_function": verify_index_html,
             "args": (key_path, user, ec2_host),
+            "requires": ["Inventory Configuration"],
             "maximum_marks": 1
         },
         {
             "testid": "Website Accessibility",
             "verify_function": verify_website_content,
             "args": (ec2_host,),
+            "requires": ["Apache Service Running"],
             "maximum_marks": 1
         }
     ]
 
-    for test in test_cases:
-        test_result = {
-            "testid": test["testid"],
-            "status": "failure",
-            "score": 0,
-            "maximum marks": test["maximum_marks"],
-            "message": ""
-        }
-
-        try:
-            success, message = test["verify_function"](*test["args"])
-            if success:
-                test_result["status"] = "success"
-                test_result["score"] = test["maximum_marks"]
-            test_result["message"] = message
-        except Exception as e:
-            test_result["message"] = f"Verification error: {str(e)}"
-        
-        data.append(test_result)
+    data = run_test_cases(test_cases, run_test, EXECUTOR, MAX_WORKERS)
 
     # Save results
     overall['data'] = data
+    if profile:
+        overall['playbook_profile'] = profile
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
 
 if __name__ == "__main__":
     # Set strict permissions for the private key
     os.chmod('inventory/ansible.pem', 0o600)
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        close_transports()
+        save_cassette()
+        print(transport_summary())
\ No newline at end of file
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    name: task_profile
+    type: aggregate
+    short_description: Write the duration and status of every task to a JSON file
+    description:
+      - Used by the autograder to build the playbook profile in evaluate.json.
+      - The file path is read from the GRADER_PLAYBOOK_PROFILE environment variable.
+      - Tasks from the playbook files listed in GRADER_PROFILE_EXCLUDE (separated
+        by the path separator) are left out, so the grader's own plays do not
+        count as the student's.
+    requirements:
+      - enable in the callbacks_enabled setting
+'''
+
+# Worst status wins when a task ran on several hosts
+STATUS_ORDER = ["skipped", "ok", "changed", "ignored", "failed", "unreachable"]
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'task_profile'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super().__init__()
+        self.path = os.environ.get('GRADER_PLAYBOOK_PROFILE', 'playbook_profile.json')
+        self.excluded = {os.path.realpath(path)
+                         for path in os.environ.get('GRADER_PROFILE_EXCLUDE', '').split(os.pathsep) if path}
+        self.tasks = []
+        self.current = None
+
+    def is_excluded(self, task):
+        path = (task.get_path() or '').rpartition(':')[0]
+        return bool(path) and os.path.realpath(path) in self.excluded
+
+    def start_task(self, task):
+        self.finish_task()
+        if self.is_excluded(task):
+            return
+        self.current = {
+            "task": task.get_name(),
+            "role": task._role.get_name() if task._role else None,
+            "status": None,
+            "start": time.monotonic(),
+        }
+
+    def finish_task(self):
+        if self.current is None:
+            return
+        start = self.current.pop("start")
+        self.current["seconds"] = round(time.monotonic() - start, 3)
+        self.tasks.append(self.current)
+        self.current = None
+
+    def record(self, status):
+        if self.current is None:
+            return
+        if self.current["status"] is None or STATUS_ORDER.index(status) > STATUS_ORDER.index(self.current["status"]):
+            self.current["status"] = status
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.start_task(task)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.start_task(task)
+
+    def v2_runner_on_ok(self, result):
+        self.record("changed" if result._result.get("changed") else "ok")
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.record("ignored" if ignore_errors else "failed")
+
+    def v2_runner_on_skipped(self, result):
+        self.record("skipped")
+
+    def v2_runner_on_unreachable(self, result):
+        self.record("unreachable")
+
+    def v2_playbook_on_stats(self, stats):
+        self.finish_task()
+        with open(self.path, 'w') as f:
+            json.dump({"tasks": self.tasks}, f, indent=4)
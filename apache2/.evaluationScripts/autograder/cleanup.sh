@@ -0,0 +1,22 @@
+#! /bin/bash
+# Return a used target to its pre-grading state so the pool can hand it out again.
+# Runs as root on the target; reset.py checks the result against the baseline fingerprint.
+set -e
+export DEBIAN_FRONTEND=noninteractive
+
+purge_packages() {
+    local packages=""
+    for pattern in "$@"; do
+        packages="$packages $(dpkg-query -W -f='${binary:Package}\n' "$pattern" 2>/dev/null || true)"
+    done
+    if [ -n "${packages// }" ]; then
+        apt-get purge -y $packages
+    fi
+}
+
+systemctl stop apache2 || true
+purge_packages 'apache2*'
+apt-get autoremove -y --purge
+
+rm -rf /var/www /etc/apache2
+rm -rf /home/ubuntu/.ansible /root/.ansible
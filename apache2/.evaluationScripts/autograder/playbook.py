@@ -0,0 +1,204 @@
+import configparser
+import gzip
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import deque
+
+from settings import (ANSIBLE_PROFILE, FACT_CACHE_DIR, PLAYBOOK_LOG, PLAYBOOK_LOG_MAX_BYTES,
+                      PLAYBOOK_TIMINGS)
+
+# Last lines of output kept in memory for error messages
+TAIL_LINES = 40
+
+# Written by callback_plugins/task_profile.py during the run
+PROFILE_FILE = os.path.join('inventory', 'playbook_profile.json')
+CALLBACK_PLUGINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'callback_plugins')
+
+# Slowest tasks listed in evaluate.json
+PROFILE_TOP_TASKS = 10
+
+# Generated next to the student's ansible.cfg so relative paths in it still resolve
+TUNED_CONFIG = 'ansible.tuned.cfg'
+
+ANSIBLE_PROFILES = ("tuned", "default")
+
+# Run after the student's playbook in the same ansible-playbook call; its package
+# and service facts are read back from the fact cache by facts.py
+FACTS_PLAYBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grading_facts.yml')
+
+# Applied on top of the student's ansible.cfg wherever it leaves an option unset.
+# The strategy stays ansible's linear default: free would let hosts run ahead of
+# each other and change what the student's plays mean.
+TUNED_SETTINGS = {
+    "defaults": {
+        "host_key_checking": "False",
+        "forks": "20",
+        "gathering": "smart",
+        "interpreter_python": "auto_silent",
+    },
+    "ssh_connection": {
+        "pipelining": "True",
+        "ssh_args": "-C -o ControlMaster=auto -o ControlPersist=600s -o ServerAliveInterval=30",
+    },
+}
+
+
+def write_tuned_config(path=TUNED_CONFIG):
+    """Write the tuned ansible.cfg, keeping every option the student's ansible.cfg sets."""
+    config = configparser.ConfigParser(interpolation=None)
+    if os.path.exists('ansible.cfg'):
+        config.read('ansible.cfg')
+    for section, options in TUNED_SETTINGS.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for option, value in options.items():
+            if not config.has_option(section, option):
+                config.set(section, option, value)
+    with open(path, 'w') as f:
+        config.write(f)
+    return path
+
+
+def read_timings():
+    if not os.path.exists(PLAYBOOK_TIMINGS):
+        return []
+    with open(PLAYBOOK_TIMINGS, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def choose_profile(mode=ANSIBLE_PROFILE):
+    """Validate the configured profile; every submission runs under the same one."""
+    if mode not in ANSIBLE_PROFILES:
+        raise ValueError(f"Unknown ansible profile '{mode}'")
+    return mode
+
+
+def record_timing(profile, seconds, returncode):
+    os.makedirs(os.path.dirname(PLAYBOOK_TIMINGS), exist_ok=True)
+    entry = {"profile": profile, "seconds": round(seconds, 2), "returncode": returncode, "at": time.time()}
+    with open(PLAYBOOK_TIMINGS, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def playbook_env(profile):
+    """Environment that enables the task_profile callback and the jsonfile fact cache.
+
+    The callback leaves out the tasks of FACTS_PLAYBOOK, which the grader appends.
+
+    The fact cache is set for every profile since the checks read it; only the
+    tuned profile also reuses it for gathering.
+    """
+    enabled = [name for name in os.environ.get('ANSIBLE_CALLBACKS_ENABLED', '').split(',') if name]
+    plugins = [path for path in os.environ.get('ANSIBLE_CALLBACK_PLUGINS', '').split(os.pathsep) if path]
+    env = dict(
+        os.environ,
+        ANSIBLE_CALLBACKS_ENABLED=','.join(enabled + ['task_profile']),
+        ANSIBLE_CALLBACK_PLUGINS=os.pathsep.join(plugins + [CALLBACK_PLUGINS]),
+        GRADER_PLAYBOOK_PROFILE=os.path.abspath(PROFILE_FILE),
+        GRADER_PROFILE_EXCLUDE=FACTS_PLAYBOOK,
+        ANSIBLE_CACHE_PLUGIN='jsonfile',
+        ANSIBLE_CACHE_PLUGIN_CONNECTION=os.path.abspath(FACT_CACHE_DIR),
+        ANSIBLE_CACHE_PLUGIN_TIMEOUT='7200',
+    )
+    os.makedirs(FACT_CACHE_DIR, exist_ok=True)
+    if profile == "tuned":
+        env["ANSIBLE_CONFIG"] = os.path.abspath(write_tuned_config())
+    return env
+
+
+def run_playbook(command, log_path=PLAYBOOK_LOG, max_bytes=PLAYBOOK_LOG_MAX_BYTES):
+    """Run the playbook, streaming its output line by line to a gzip log.
+
+    Memory stays flat however verbose the playbook is: only the last
+    TAIL_LINES lines are held, and the log stops growing after max_bytes of
+    output, noting how many lines were dropped. The wall time is recorded per
+    ansible profile. Returns (returncode, tail, run) where run describes the
+    profile used and the wall time.
+    """
+    tail = deque(maxlen=TAIL_LINES)
+    written = 0
+    dropped = 0
+    if os.path.exists(PROFILE_FILE):
+        os.remove(PROFILE_FILE)
+    profile = choose_profile()
+    start = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        shell=True,
+        executable='/bin/bash',
+        env=playbook_env(profile),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors='replace'
+    )
+    with gzip.open(log_path, 'wt') as log:
+        for line in process.stdout:
+            tail.append(line.rstrip('\n'))
+            if written + len(line) <= max_bytes:
+                log.write(line)
+                written += len(line)
+            else:
+                dropped += 1
+        returncode = process.wait()
+        if dropped:
+            log.write(f"[{dropped} more lines dropped after {max_bytes} bytes]\n")
+        log.write(f"[ansible-playbook exited with {returncode}]\n")
+    seconds = time.monotonic() - start
+    record_timing(profile, seconds, returncode)
+    return returncode, list(tail), {"ansible_profile": profile, "wall_seconds": round(seconds, 2)}
+
+
+def playbook_profile(run, top=PROFILE_TOP_TASKS):
+    """Summarise the task timings of the last run: totals and the slowest tasks."""
+    if not os.path.exists(PROFILE_FILE):
+        return None
+    with open(PROFILE_FILE, 'r') as f:
+        tasks = json.load(f)["tasks"]
+    statuses = {}
+    for task in tasks:
+        statuses[task["status"]] = statuses.get(task["status"], 0) + 1
+    return dict(
+        run,
+        total_seconds=round(sum(task["seconds"] for task in tasks), 2),
+        tasks=len(tasks),
+        statuses=statuses,
+        slowest_tasks=sorted(tasks, key=lambda task: task["seconds"], reverse=True)[:top],
+    )
+
+
+def timing_report():
+    """Compare playbook wall times of successful runs with and without the tuned profile.
+
+    Both only show up when the grader was run under each ANSIBLE_PROFILE in turn,
+    e.g. by the benchmark with GRADER_ANSIBLE_PROFILE set.
+    """
+    timings = {}
+    for timing in read_timings():
+        if timing["returncode"] == 0:
+            timings.setdefault(timing["profile"], []).append(timing["seconds"])
+    if not timings:
+        return "No successful playbook runs recorded"
+    lines = []
+    for profile in ("default", "tuned"):
+        if profile in timings:
+            seconds = timings[profile]
+            lines.append(f"{profile:8} runs={len(seconds):4} mean={statistics.mean(seconds):8.2f}s "
+                         f"median={statistics.median(seconds):8.2f}s")
+    if "default" in timings and "tuned" in timings:
+        saved = statistics.median(timings["default"]) - statistics.median(timings["tuned"])
+        lines.append(f"tuned profile saves {saved:.2f}s per run (median)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    if command == 'report':
+        print(timing_report())
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,253 @@
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from providers import account_key, get_provider
+from settings import POOL_DIR, POOL_PROVIDER, POOL_SIZE
+
+# Written by init.py next to ansible.pem and read back by reset.py
+LEASE_FILE = os.path.join('inventory', 'lease.json')
+
+# A provisioning marker older than this belongs to a refill that died
+PROVISIONING_TIMEOUT = 30 * 60
+
+# Argument telling a refill process to read the credentials from stdin
+CREDENTIALS_STDIN = '--credentials-stdin'
+
+# A lease older than this belongs to a grading run that died before reset.py
+LEASE_TIMEOUT = 2 * 60 * 60
+
+
+class HostPool:
+    """Directory-backed pool of ready target hosts, handed out through lease files.
+
+    Layout under root: ready/<id>.json and leased/<id>.json hold host records,
+    provisioning/<id> marks hosts being created and hosts/<id>/ is each host's
+    provider working directory. pool.lock serialises every state change.
+    """
+
+    def __init__(self, root, size, provider):
+        self.root = root
+        self.size = size
+        self.provider = provider
+        for state in ('ready', 'leased', 'provisioning', 'hosts'):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self.root, 'pool.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def record_path(self, state, host_id):
+        return os.path.join(self.root, state, f"{host_id}.json")
+
+    def records(self, state):
+        hosts = []
+        for name in os.listdir(os.path.join(self.root, state)):
+            with open(os.path.join(self.root, state, name), 'r') as f:
+                hosts.append(json.load(f))
+        return sorted(hosts, key=lambda host: host["created_at"])
+
+    def write_record(self, state, host):
+        path = self.record_path(state, host["id"])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(host, f, indent=4)
+        os.replace(path + '.tmp', path)
+
+    def provisioning(self):
+        """Return ids of hosts being created, dropping markers left by dead refills."""
+        ids = []
+        directory = os.path.join(self.root, 'provisioning')
+        for host_id in os.listdir(directory):
+            marker = os.path.join(directory, host_id)
+            if time.time() - os.path.getmtime(marker) > PROVISIONING_TIMEOUT:
+                os.remove(marker)
+            else:
+                ids.append(host_id)
+        return ids
+
+    def provision(self, host_id):
+        """Create one host with the provider and return its record."""
+        workdir = os.path.join(self.root, 'hosts', host_id)
+        try:
+            host = self.provider.create(workdir)
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+        host.update({
+            "id": host_id,
+            "workdir": workdir,
+            "provider": self.provider.name,
+            "created_at": time.time(),
+        })
+        return host
+
+    def stale_leases(self):
+        """Take the records of leases whose grading run never released them."""
+        stale = []
+        for host in self.records('leased'):
+            if time.time() - host.get("leased_at", host["created_at"]) > LEASE_TIMEOUT:
+                os.remove(self.record_path('leased', host["id"]))
+                stale.append(host)
+        return stale
+
+    def lease(self, holder):
+        """Hand out the oldest ready host, provisioning one if the pool is empty."""
+        with self.locked():
+            ready = self.records('ready')
+            host = ready[0] if ready else None
+            if host:
+                os.remove(self.record_path('ready', host["id"]))
+        if host is None:
+            print("Warm pool is empty, provisioning a host for this submission")
+            host = self.provision(uuid.uuid4().hex[:8])
+        host["holder"] = holder
+        host["leased_at"] = time.time()
+        with self.locked():
+            self.write_record('leased', host)
+        return host
+
+    def release(self, host, recycle=None):
+        """Return a leased host and report whether it was put back in the pool.
+
+        With recycle, a host for which recycle(host) succeeds goes back to
+        ready/ for the next submission; every other host is destroyed and the
+        pool refills separately.
+        """
+        with self.locked():
+            path = self.record_path('leased', host["id"])
+            if os.path.exists(path):
+                os.remove(path)
+
+        if recycle:
+            try:
+                recycled, message = recycle(host)
+            except Exception as e:
+                recycled, message = False, str(e)
+            print(f"Recycling pool host {host['id']}: {message}")
+            if recycled:
+                host.pop("holder", None)
+                host.pop("leased_at", None)
+                host["recycled"] = host.get("recycled", 0) + 1
+                with self.locked():
+                    self.write_record('ready', host)
+                return True
+
+        self.destroy(host)
+        return False
+
+    def destroy(self, host):
+        self.provider.destroy(host)
+        shutil.rmtree(host["workdir"], ignore_errors=True)
+
+    def refill(self):
+        """Destroy hosts of stale leases, then provision hosts until ready plus in-flight hosts reach the pool size."""
+        with self.locked():
+            stale = self.stale_leases()
+        for host in stale:
+            print(f"Destroying pool host {host['id']}, leased by {host.get('holder')} and never released")
+            try:
+                self.destroy(host)
+            except Exception as e:
+                print(f"Pool host {host['id']} failed to destroy: {e}")
+
+        with self.locked():
+            missing = self.size - len(self.records('ready')) - len(self.provisioning())
+            host_ids = [uuid.uuid4().hex[:8] for _ in range(max(missing, 0))]
+            for host_id in host_ids:
+                open(os.path.join(self.root, 'provisioning', host_id), 'w').close()
+
+        for host_id in host_ids:
+            try:
+                host = self.provision(host_id)
+                with self.locked():
+                    self.write_record('ready', host)
+                print(f"Pool host {host_id} ready at {host['public_ip']}")
+            except Exception as e:
+                print(f"Pool host {host_id} failed to provision: {e}")
+            finally:
+                marker = os.path.join(self.root, 'provisioning', host_id)
+                if os.path.exists(marker):
+                    os.remove(marker)
+
+    def refill_async(self, credentials):
+        """Refill in a detached process so grading does not wait for new hosts.
+
+        The credentials go over the child's stdin, so they never show up in
+        its environment or command line.
+        """
+        if self.size == 0:
+            return
+        with open(os.path.join(self.root, 'refill.log'), 'a') as log:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), 'refill', CREDENTIALS_STDIN],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stdin=subprocess.PIPE,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                text=True,
+                start_new_session=True
+            )
+        with process.stdin:
+            process.stdin.write(json.dumps(credentials))
+
+    def drain(self):
+        """Destroy every ready host, then the shared resources once no host uses them.
+
+        The shared security group and key pool live exactly as long as the
+        pool: with hosts still leased or provisioning they are kept, and the
+        next drain removes them.
+        """
+        with self.locked():
+            hosts = self.records('ready')
+            for host in hosts:
+                os.remove(self.record_path('ready', host["id"]))
+        for host in hosts:
+            self.destroy(host)
+        with self.locked():
+            if self.records('leased') or self.provisioning():
+                print("Keeping the shared resources, hosts are still leased or provisioning")
+                return
+            self.provider.destroy_shared()
+
+
+def open_pool(credentials):
+    """Open the pool for the AWS account the credentials belong to."""
+    provider = get_provider(POOL_PROVIDER, credentials)
+    return HostPool(os.path.join(POOL_DIR, account_key(credentials)), POOL_SIZE, provider)
+
+
+def load_credentials(from_stdin=False):
+    if from_stdin:
+        return json.load(sys.stdin)
+    with open('data.json', 'r') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    pool = open_pool(load_credentials(CREDENTIALS_STDIN in sys.argv[2:]))
+    if command == 'refill':
+        pool.refill()
+    elif command == 'drain':
+        pool.drain()
+    elif command == 'destroy-shared':
+        # For per-submission hosts (POOL_SIZE = 0), once no submission is being graded;
+        # with a pool, drain already does this
+        pool.provider.destroy_shared()
+    elif command == 'status':
+        print(f"ready={len(pool.records('ready'))} leased={len(pool.records('leased'))} "
+              f"provisioning={len(pool.provisioning())} size={pool.size}")
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Time the full grading pipeline of each lab against a local target.
+
+Runs init -> readiness -> ansible-playbook -> checks -> reset with the lab's
+reference solution, the way evaluate.sh and grader.sh do. It records wall time,
+SSH calls and traced subprocesses per phase, writes a JSON report and exits
+non-zero when a phase fails or goes over its budget in budgets.json. The report
+and the grader's own timing files go to a directory of their own for each run.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+SHIM = os.path.join(BENCHMARK_DIR, 'shim.sh')
+
+LABS = ["apache2", "mongodb", "node-react", "Message_Board_MERN"]
+PHASES = ["init", "readiness", "playbook", "checks", "reset"]
+
+# Tools wrapped by shim.sh; every call is counted as a subprocess of its phase
+TRACED = ["ssh", "scp", "sftp", "ssh-keygen", "terraform", "docker", "podman", "ansible-playbook"]
+SSH_COMMANDS = ("ssh", "scp", "sftp")
+
+# Providers whose hosts the playbook can reach; the pool's fake provider hands out
+# addresses nothing listens on, so every run would end with an unreachable playbook
+PROVIDERS = ["container", "boto3", "terraform"]
+
+# The container provider only needs the key to exist, no cloud is involved
+LOCAL_CREDENTIALS = {
+    "Instructor Access key ID": "benchmark",
+    "Instructor Secret access key": "benchmark",
+}
+
+
+def overlay(src_dir, dst_dir):
+    """Copy a lab directory over the workspace, except its inventory, like evaluate.sh's rsync."""
+    for name in os.listdir(src_dir):
+        if name == 'inventory':
+            continue
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, name)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, dirs_exist_ok=True)
+        else:
+            shutil.copy(src, dst)
+
+
+def prepare_workspace(lab, workdir, credentials):
+    """Copy the autograder, then the student's lab directory and the reference solution over it.
+
+    The lab directory brings the files the solution's roles copy but do not
+    carry themselves, such as app/ and client/.
+    """
+    autograder = os.path.join(workdir, 'autograder')
+    shutil.copytree(os.path.join(ROOT, lab, '.evaluationScripts', 'autograder'), autograder,
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    overlay(os.path.join(ROOT, lab, 'labDirectory'), autograder)
+    overlay(os.path.join(ROOT, lab, 'solution'), autograder)
+    with open(os.path.join(autograder, 'data.json'), 'w') as f:
+        json.dump(credentials, f, indent=4)
+    return autograder
+
+
+def install_shims(bin_dir):
+    os.makedirs(bin_dir, exist_ok=True)
+    for name in TRACED:
+        os.symlink(SHIM, os.path.join(bin_dir, name))
+
+
+def run_phase(phase, script, cwd, env, log_dir):
+    """Run one grader script and return (seconds, returncode)."""
+    env = dict(env, BENCH_PHASE=phase)
+    start = time.monotonic()
+    with open(os.path.join(log_dir, f"{phase}.log"), 'w') as log:
+        result = subprocess.run([sys.executable, script], cwd=cwd, env=env,
+                                stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+    return time.monotonic() - start, result.returncode
+
+
+def read_calls(trace_file):
+    if not os.path.exists(trace_file):
+        return []
+    with open(trace_file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def phase_budgets(budgets, lab):
+    return dict(budgets["default"], **budgets.get("labs", {}).get(lab, {}))
+
+
+def summarise_checks(autograder):
+    # autograder.py writes its results next to the autograder directory
+    path = os.path.join(os.path.dirname(autograder), 'evaluate.json')
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, 'r') as f:
+        data = json.load(f)["data"]
+    return {
+        "passed": sum(1 for test in data if test["status"] == "success"),
+        "total": len(data),
+    }
+
+
+def benchmark_lab(lab, env, credentials, budgets, keep, run_dir, cassette=None):
+    """Run the pipeline for one lab and return its report entry.
+
+    The terraform init and playbook timings the grader records go to
+    <run_dir>/<lab>/ instead of the machine-wide files.
+
+    cassette is (mode, directory). "record" saves the checks' probes to
+    <directory>/<lab>.json.gz; "replay" runs only the checks from it, with no
+    host, which makes the checks phase deterministic and network-free.
+    """
+    workdir = tempfile.mkdtemp(prefix=f"bench-{lab}-")
+    trace_file = os.path.join(workdir, 'calls.jsonl')
+    bin_dir = os.path.join(workdir, 'bin')
+    log_dir = os.path.join(workdir, 'logs')
+    os.makedirs(log_dir)
+    install_shims(bin_dir)
+    timings_dir = os.path.join(run_dir, lab)
+    os.makedirs(timings_dir, exist_ok=True)
+
+    env = dict(
+        env,
+        BENCH_LOG=trace_file,
+        BENCH_REAL_PATH=env["PATH"],
+        PATH=bin_dir + os.pathsep + env["PATH"],
+        GRADER_POOL_DIR=os.path.join(workdir, 'pool'),
+        GRADER_SHARED_DIR=os.path.join(workdir, 'shared'),
+        GRADER_TERRAFORM_TIMINGS=os.path.join(timings_dir, 'terraform-init.jsonl'),
+        GRADER_PLAYBOOK_TIMINGS=os.path.join(timings_dir, 'playbook.jsonl'),
+    )
+    autograder = prepare_workspace(lab, workdir, credentials)
+
+    pipeline = [("init", "init.py"), ("readiness", "readiness.py"),
+                ("checks", "autograder.py"), ("reset", "reset.py")]
+    if cassette:
+        mode, directory = cassette
+        os.makedirs(directory, exist_ok=True)
+        env = dict(env, GRADER_CASSETTE_MODE=mode,
+                   GRADER_CASSETTE=os.path.join(os.path.abspath(directory), f"{lab}.json.gz"))
+        if mode == "replay":
+            pipeline = [("checks", "autograder.py")]
+            open(os.path.join(autograder, 'inventory', 'ansible.pem'), 'a').close()
+
+    seconds, returncodes = {}, {}
+    stopped = False
+    for phase, script in pipeline:
+        seconds[phase], returncodes[phase] = run_phase(phase, script, autograder, env, log_dir)
+        if phase == "init" and returncodes[phase] != 0:
+            stopped = True
+            break
+
+    calls = read_calls(trace_file)
+    # The playbook runs inside autograder.py; split its time out of the checks phase
+    seconds["playbook"] = sum(c["end"] - c["start"] for c in calls if c["command"] == "ansible-playbook")
+    if "checks" in seconds:
+        seconds["checks"] = max(seconds["checks"] - seconds["playbook"], 0.0)
+        returncodes["playbook"] = max((c["rc"] for c in calls if c["command"] == "ansible-playbook"), default=0)
+
+    budget = phase_budgets(budgets, lab)
+    phases = {}
+    for phase in PHASES:
+        if phase not in seconds:
+            continue
+        phase_calls = [c for c in calls if c["phase"] == phase]
+        phases[phase] = {
+            "seconds": round(seconds[phase], 2),
+            "budget": budget.get(phase),
+            "over_budget": budget.get(phase) is not None and seconds[phase] > budget[phase],
+            "returncode": returncodes.get(phase),
+            "ssh_calls": sum(1 for c in phase_calls if c["command"] in SSH_COMMANDS),
+            "subprocesses": len(phase_calls),
+        }
+
+    report = {
+        "phases": phases,
+        "total_seconds": round(sum(seconds.values()), 2),
+        "stopped_after_init": stopped,
+        "checks": summarise_checks(autograder),
+        "workdir": workdir if keep else None,
+    }
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def failures(lab, report):
+    problems = []
+    for phase, result in report["phases"].items():
+        if result["over_budget"]:
+            problems.append(f"{lab}/{phase}: {result['seconds']}s is over the {result['budget']}s budget")
+        # grader.sh grades anyway when the readiness probe gives up
+        if result["returncode"] and phase != "readiness":
+            problems.append(f"{lab}/{phase}: exited with {result['returncode']}")
+    if report["stopped_after_init"]:
+        problems.append(f"{lab}: pipeline stopped after init")
+    return problems
+
+
+def print_table(results):
+    print(f"{'lab':20} " + " ".join(f"{phase:>10}" for phase in PHASES) + f" {'ssh':>6} {'procs':>6} {'checks':>8}")
+    for lab, report in results.items():
+        cells = [f"{report['phases'][p]['seconds']:>9.1f}s" if p in report["phases"] else f"{'-':>10}"
+                 for p in PHASES]
+        ssh_calls = sum(r["ssh_calls"] for r in report["phases"].values())
+        subprocesses = sum(r["subprocesses"] for r in report["phases"].values())
+        checks = report["checks"]
+        passed = f"{checks['passed']}/{checks['total']}" if checks else "-"
+        print(f"{lab:20} " + " ".join(cells) + f" {ssh_calls:>6} {subprocesses:>6} {passed:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("labs", nargs="*", default=LABS, help="labs to run (default: all)")
+    parser.add_argument("--provider", default="container", choices=PROVIDERS,
+                        help="pool provider for the target host (default: container)")
+    parser.add_argument("--credentials", help="data.json with real AWS credentials for boto3/terraform")
+    parser.add_argument("--budgets", default=os.path.join(BENCHMARK_DIR, 'budgets.json'))
+    parser.add_argument("--run-dir", default=os.path.join("bench-runs", time.strftime("%Y%m%d-%H%M%S")),
+                        help="directory for this run's report and timings (default: bench-runs/<start time>)")
+    parser.add_argument("--report", help="report path (default: report.json in the run directory)")
+    parser.add_argument("--keep", action="store_true", help="keep each lab's workspace and logs")
+    cassettes = parser.add_mutually_exclusive_group()
+    cassettes.add_argument("--record", metavar="DIR", help="record each lab's probes to a cassette in DIR")
+    cassettes.add_argument("--replay", metavar="DIR", help="run only the checks, replayed from cassettes in DIR")
+    args = parser.parse_args()
+
+    for lab in args.labs:
+        if lab not in LABS:
+            parser.error(f"unknown lab '{lab}'")
+    with open(args.budgets, 'r') as f:
+        budgets = json.load(f)
+    credentials = LOCAL_CREDENTIALS
+    if args.credentials:
+        with open(args.credentials, 'r') as f:
+            credentials = json.load(f)
+
+    env = dict(os.environ, GRADER_POOL_PROVIDER=args.provider, GRADER_POOL_SIZE="0")
+    run_dir = os.path.abspath(args.run_dir)
+    os.makedirs(run_dir, exist_ok=True)
+    report_path = args.report or os.path.join(run_dir, 'report.json')
+
+    cassette = None
+    if args.record:
+        cassette = ("record", args.record)
+    elif args.replay:
+        cassette = ("replay", args.replay)
+
+    results = {}
+    for lab in args.labs:
+        print(f"Benchmarking {lab} with the {args.provider} provider")
+        results[lab] = benchmark_lab(lab, env, credentials, budgets, args.keep, run_dir, cassette)
+
+    problems = [problem for lab, report in results.items() for problem in failures(lab, report)]
+    with open(report_path, 'w') as f:
+        json.dump({"provider": args.provider, "run_dir": run_dir, "labs": results, "failures": problems}, f, indent=4)
+
+    print_table(results)
+    print(f"Report written to {report_path}")
+    for problem in problems:
+        print(f"FAIL {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
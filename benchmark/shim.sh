@@ -0,0 +1,16 @@
+#!/bin/bash
+# Installed on PATH under the name of each traced tool; logs one JSON line per call to $BENCH_LOG
+name=$(basename "$0")
+real=$(PATH="$BENCH_REAL_PATH" command -v "$name") || { echo "$name: not found" >&2; exit 127; }
+
+# Everything ansible-playbook spawns belongs to the playbook phase
+if [ "$name" = "ansible-playbook" ]; then
+    export BENCH_PHASE=playbook
+fi
+
+start=$(date +%s.%N)
+"$real" "$@"
+rc=$?
+end=$(date +%s.%N)
+echo "{\"phase\": \"$BENCH_PHASE\", \"command\": \"$name\", \"start\": $start, \"end\": $end, \"rc\": $rc}" >> "$BENCH_LOG"
+exit $rc
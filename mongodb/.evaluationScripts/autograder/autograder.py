@@ -1,66 +1,58 @@
 import json
 import os
-import subprocess
-import configparser
-import time
+from target import parse_inventory
+from transport import HostUnreachable, get_transport, close_transports, transport_summary
+from facts import get_facts
+from configfiles import verify_config_file
+from mongostate import compare_state, database_state, expected_state
+from runner import run_test_cases
+from settings import EXECUTOR, MAX_WORKERS
+from recycle import record_baseline
+from playbook import FACTS_PLAYBOOK, run_playbook, playbook_profile
+from cassette import CASSETTE, save_cassette
 
-def execute_command(command):
-    """Execute a shell command and return the output and error."""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            executable='/bin/bash'
-        )
-        return result.stdout.strip(), None
-    except subprocess.CalledProcessError as e:
-        return None, f"Error: {e.stderr.strip()}"
+PREREQUISITE_PACKAGES = ['curl', 'gnupg']
 
-def parse_inventory():
-    """Parse inventory.ini to get EC2 connection details"""
-    config = configparser.ConfigParser(allow_no_value=True)
-    config.read('inventory/inventory.ini')
-    
-    ec2_host = None
-    user = 'ubuntu'
-    key_path = 'inventory/ansible.pem'
-    
-    if 'DB-server' in config:
-        for host in config['DB-server']:
-            parts = host.split()
-            if parts:
-                ec2_host = parts[0]
-                for param in parts[1:]:
-                    if param.startswith('ansible_user='):
-                        user = param.split('=')[1]
-                    elif param.startswith('ansible_ssh_private_key_file='):
-                        key_path = param.split('=')[1]
-                break
-    
-    if not ec2_host:
-        raise ValueError("EC2 host not found in inventory.ini")
-    
-    return ec2_host, user, key_path
+MONGODB_PACKAGES = {
+    'mongodb-org': '8.0.5',
+    'mongodb-org-database': '8.0.5',
+    'mongodb-org-server': '8.0.5',
+    'mongodb-org-shell': '8.0.5',
+    'mongodb-org-tools': '8.0.5',
+    'mongodb-mongosh': '2.4.2'
+}
+
+MONGODB_DIRECTORIES = ['/var/lib/mongodb', '/var/log/mongodb']
+
+# Everything the checks inspect, collected from the host in one round trip
+FACT_SPEC = {
+    "paths": [
+        "/usr/share/keyrings",
+        "/etc/mongod.conf",
+        "/etc/apt/sources.list.d/mongodb-org-8.0.list.list",
+        "/usr/share/keyrings/mongodb-server-8.0.gpg",
+    ] + MONGODB_DIRECTORIES,
+    "packages": PREREQUISITE_PACKAGES + list(MONGODB_PACKAGES),
+    "services": ["mongod"],
+}
 
 def run_remote_command(command, key_path, user, host):
-    """Execute a command on the EC2 instance via SSH"""
-    ssh_cmd = f"ssh -i {key_path} -o StrictHostKeyChecking=no {user}@{host} '{command}'"
-    return execute_command(ssh_cmd)
+    """Execute a command on the EC2 instance over the shared SSH transport"""
+    return get_transport(key_path, user, host).run(command)
+
+def host_facts(key_path, user, host):
+    """Return the fact snapshot of the EC2 instance"""
+    return get_facts(key_path, user, host, FACT_SPEC)
 
 def verify_keyrings_directory(key_path, user, host):
     """Verify /usr/share/keyrings directory configuration"""
     # Check directory exists with correct permissions
-    out, err = run_remote_command(
-        'stat -c "%F %U:%G %a" /usr/share/keyrings', key_path, user, host
-    )
+    out = host_facts(key_path, user, host).stat('/usr/share/keyrings', '%F %U:%G %a')
     
     if not out:
         return False, "Keyrings directory missing"
     
-    parts = out.split()
+    parts = out.rsplit(' ', 2)
     if (parts[0] != 'directory' or 
         parts[1] != 'root:root' or 
         parts[2] != '755'):
@@ -70,41 +62,20 @@ def verify_keyrings_directory(key_path, user, host):
 
 def verify_mongod_config(key_path, user, host):
     """Verify MongoDB configuration file matches template"""
+    facts = host_facts(key_path, user, host)
+
     # First check if config file exists
-    out, err = run_remote_command(
-        "[ -f /etc/mongod.conf ] && echo exists", key_path, user, host
-    )
-    if out != "exists":
+    if not facts.test('-f', '/etc/mongod.conf'):
         return False, "Mongod config file missing"
-    
-    # Get local template content
-    try:
-        with open('roles/database/templates/mongod.conf.j2', 'r') as f:
-            local_content = [line.strip() for line in f.readlines() if line.strip()]
-    except Exception as e:
-        return False, f"Local template error: {str(e)}"
-    
-    # Get remote config content
-    remote_content, err = run_remote_command(
-        "cat /etc/mongod.conf", key_path, user, host
-    )
-    if not remote_content:
-        return False, "Failed to read remote config"
-    
-    remote_lines = [line.strip() for line in remote_content.split('\n') if line.strip()]
-    
-    # Compare content line-by-line (ignoring whitespace)
-    if len(local_content) != len(remote_lines):
-        return False, "Config content length mismatch"
-    
-    for local_line, remote_line in zip(local_content, remote_lines):
-        if local_line != remote_line:
-            return False, f"Config mismatch:\nExpected: {local_line}\nFound: {remote_line}"
-    
+
+    # Compare against the template rendered locally, by digest unless they differ
+    matches, message = verify_config_file(get_transport(key_path, user, host), host, '/etc/mongod.conf',
+                                          'roles/database/templates/mongod.conf.j2', 'database')
+    if not matches:
+        return False, message
+
     # Check file permissions
-    out, err = run_remote_command(
-        'stat -c "%U:%G %a" /etc/mongod.conf', key_path, user, host
-    )
+    out = facts.stat('/etc/mongod.conf', '%U:%G %a')
     if out != "mongodb:mongodb 644":
         return False, f"Invalid file permissions: {out}"
     
@@ -112,76 +83,96 @@ def verify_mongod_config(key_path, user, host):
 
 def verify_prerequisites(key_path, user, host):
     """Verify required packages are installed"""
-    packages = ['curl', 'gnupg']
-    for pkg in packages:
-        out, err = run_remote_command(f"dpkg -s {pkg}", key_path, user, host)
-        if not out or 'Status: install ok installed' not in out:
+    facts = host_facts(key_path, user, host)
+    for pkg in PREREQUISITE_PACKAGES:
+        if not facts.package_installed(pkg):
             return False, f"{pkg} not installed"
     return True, "All prerequisites installed"
 
 def verify_mongodb_repo(key_path, user, host):
     """Verify MongoDB repository exists"""
-    out, err = run_remote_command(
-        "[ -f /etc/apt/sources.list.d/mongodb-org-8.0.list.list ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    if not host_facts(key_path, user, host).test('-f', '/etc/apt/sources.list.d/mongodb-org-8.0.list.list'):
         return False, "MongoDB repo file missing"
     return True, "MongoDB repo configured"
 
 def verify_gpg_key(key_path, user, host):
     """Verify MongoDB GPG key exists"""
-    out, err = run_remote_command(
-        "[ -f /usr/share/keyrings/mongodb-server-8.0.gpg ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    if not host_facts(key_path, user, host).test('-f', '/usr/share/keyrings/mongodb-server-8.0.gpg'):
         return False, "MongoDB GPG key missing"
     return True, "MongoDB GPG key present"
 
 def verify_mongodb_versions(key_path, user, host):
     """Verify MongoDB packages installed with exact versions"""
-    packages = {
-        'mongodb-org': '8.0.5',
-        'mongodb-org-database': '8.0.5',
-        'mongodb-org-server': '8.0.5',
-        'mongodb-org-shell': '8.0.5',
-        'mongodb-org-tools': '8.0.5',
-        'mongodb-mongosh': '2.4.2'
-    }
-    
-    for pkg, version in packages.items():
-        out, err = run_remote_command(f"apt-cache policy {pkg} | grep 'Installed'", key_path, user, host)
+    facts = host_facts(key_path, user, host)
+    for pkg, version in MONGODB_PACKAGES.items():
+        out = facts.package_version(pkg)
         if not out or version not in out:
             return False, f"{pkg} version mismatch"
     return True, "All MongoDB packages installed correctly"
 
 def verify_directories(key_path, user, host):
     """Verify MongoDB directories exist with proper permissions"""
-    dirs = ['/var/lib/mongodb', '/var/log/mongodb']
-    for d in dirs:
-        out, err = run_remote_command(
-            f'stat -c "%U:%G %a" {d}', key_path, user, host
-        )
+    facts = host_facts(key_path, user, host)
+    for d in MONGODB_DIRECTORIES:
+        out = facts.stat(d, '%U:%G %a')
         if out != 'mongodb:mongodb 755':
             return False, f"Invalid permissions for {d}"
     return True, "MongoDB directories configured properly"
 
 def verify_service_status(key_path, user, host):
     """Verify MongoDB service is enabled and running"""
-    out_active, err = run_remote_command(
-        "systemctl is-active mongod", key_path, user, host
-    )
-    out_enabled, err = run_remote_command(
-        "systemctl is-enabled mongod", key_path, user, host
-    )
+    service = host_facts(key_path, user, host).service("mongod")
+    out_active, out_enabled = service["active"], service["enabled"]
     if out_active == 'active' and out_enabled == 'enabled':
         return True, "Service running and enabled"
     return False, f"Service state: active={out_active}, enabled={out_enabled}"
 
+def verify_database_contents(key_path, user, host):
+    """Verify MasterDB holds what populate.js inserts, read back in one mongosh call"""
+    try:
+        expected = expected_state('roles/database/files/populate.js')
+    except Exception as e:
+        return False, f"Local populate script error: {str(e)}"
+
+    state = database_state(get_transport(key_path, user, host), 'MasterDB')
+    if state["version"] != MONGODB_PACKAGES['mongodb-org-server']:
+        return False, f"MongoDB server {state['version']} running, expected {MONGODB_PACKAGES['mongodb-org-server']}"
+
+    problems = compare_state(expected, state)
+    if problems:
+        return False, "; ".join(problems)
+    counts = ", ".join(f"{name}: {collection['count']} documents" for name, collection in sorted(expected.items()))
+    return True, f"MasterDB matches populate.js ({counts})"
+
+def run_test(test, prerequisite=None):
+    """Run one test case and build its evaluate.json entry"""
+    test_result = {
+        "testid": test["testid"],
+        "status": "failure",
+        "score": 0,
+        "maximum marks": test["maximum_marks"],
+        "message": ""
+    }
+
+    if prerequisite:
+        test_result["message"] = f"Skipped: prerequisite '{prerequisite}' failed"
+        return test_result
+
+    try:
+        success, message = test["verify_function"](*test["args"])
+        if success:
+            test_result["status"] = "success"
+            test_result["score"] = test["maximum_marks"]
+        test_result["message"] = message
+    except HostUnreachable as e:
+        test_result["message"] = str(e)
+    except Exception as e:
+        test_result["message"] = f"Verification error: {str(e)}"
+
+    return test_result
+
 def main():
     overall = {"data": []}
-    data = []
     
     try:
         ec2_host, user, key_path = parse_inventory()
@@ -198,8 +189,16 @@ def main():
             json.dump(overall, f, indent=4)
         return
 
-    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml"
-    pb_out, pb_err = execute_command(playbook_cmd)
+    record_baseline()
+
+    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml {FACTS_PLAYBOOK}"
+    profile = None
+    if not CASSETTE.replaying:
+        returncode, tail, run = run_playbook(playbook_cmd)
+        if returncode != 0:
+            print(f"ansible-playbook exited with {returncode}, last lines of output:")
+            print("\n".join(tail))
+        profile = playbook_profile(run)
     
     test_cases = [
         {
@@ -249,33 +248,29 @@ def main():
             "verify_function": verify_service_status,
             "args": (key_path, user, ec2_host),
             "maximum_marks": 1
+        },
+        {
+            "testid": "Populate database",
+            "verify_function": verify_database_contents,
+            "args": (key_path, user, ec2_host),
+            "requires": ["Service status"],
+            "maximum_marks": 1
         }
     ]
 
-    for test in test_cases:
-        test_result = {
-            "testid": test["testid"],
-            "status": "failure",
-            "score": 0,
-            "maximum marks": test["maximum_marks"],
-            "message": ""
-        }
-
-        try:
-            success, message = test["verify_function"](*test["args"])
-            if success:
-                test_result["status"] = "success"
-                test_result["score"] = test["maximum_marks"]
-            test_result["message"] = message
-        except Exception as e:
-            test_result["message"] = f"Verification error: {str(e)}"
-        
-        data.append(test_result)
+    data = run_test_cases(test_cases, run_test, EXECUTOR, MAX_WORKERS)
 
     overall['data'] = data
+    if profile:
+        overall['playbook_profile'] = profile
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
 
 if __name__ == "__main__":
     os.chmod('inventory/ansible.pem', 0o600)
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        close_transports()
+        save_cassette()
+        print(transport_summary())
\ No newline at end of file
@@ -0,0 +1,27 @@
+#! /bin/bash
+# Return a used target to its pre-grading state so the pool can hand it out again.
+# Runs as root on the target; reset.py checks the result against the baseline fingerprint.
+set -e
+export DEBIAN_FRONTEND=noninteractive
+
+purge_packages() {
+    local packages=""
+    for pattern in "$@"; do
+        packages="$packages $(dpkg-query -W -f='${binary:Package}\n' "$pattern" 2>/dev/null || true)"
+    done
+    if [ -n "${packages// }" ]; then
+        apt-get purge -y $packages
+    fi
+}
+
+systemctl stop mongod || true
+purge_packages 'mongodb-org*' mongodb-mongosh 'mongodb-database-tools*'
+apt-get autoremove -y --purge
+# The server package creates this account and purging it does not remove it
+userdel mongodb 2>/dev/null || true
+groupdel mongodb 2>/dev/null || true
+
+rm -rf /var/lib/mongodb /var/log/mongodb /etc/mongod.conf /tmp/mongodb-*.sock /tmp/populate.js
+rm -f /etc/apt/sources.list.d/mongodb-org-8.0.list* /usr/share/keyrings/mongodb-server-8.0.gpg
+rm -rf /home/ubuntu/.mongodb /home/ubuntu/.ansible /root/.mongodb /root/.ansible
+systemctl daemon-reload
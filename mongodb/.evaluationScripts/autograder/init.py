@@ -3,34 +3,66 @@ import os
 import shutil
 import subprocess
 
+from pool import LEASE_FILE, open_pool
+from providers import TerraformProvider
+from settings import POOL_PROVIDER, POOL_SIZE
+from tfcache import terraform_env, terraform_init
+
+def install_host(public_ip, key_src):
+    """Point the inventory at a provisioned host and its SSH key"""
+    # Copy SSH key to inventory
+    key_dest = os.path.join('inventory', 'ansible.pem')
+    shutil.copy(key_src, key_dest)
+    os.chmod(key_dest, 0o600)
+
+    # Update inventory file
+    with open('inventory/inventory.ini', 'r') as f:
+        inventory = f.read()
+    
+    inventory = inventory.replace("<public-ip>", public_ip)
+    
+    with open('inventory/inventory.ini', 'w') as f:
+        f.write(inventory)
+
+    print("Setup completed successfully!")
+    print(f"Public IP: {public_ip}")
+    print(f"SSH Key: {key_dest}")
+
+def lease_host(credentials):
+    """Take a ready host from the warm pool and record the lease for reset.py"""
+    pool = open_pool(credentials)
+    host = pool.lease(holder=os.getcwd())
+    with open(LEASE_FILE, 'w') as f:
+        json.dump({"pool": pool.root, "host": host}, f, indent=4)
+
+    # Replace the leased host in the background
+    pool.refill_async(credentials)
+
+    install_host(host["public_ip"], host["key_file"])
+
 def main():
     # Load credentials from data.json
     with open('data.json', 'r') as f:
         credentials = json.load(f)
-    
-    # Replace placeholders in main.tf
-    with open('terraform/main.tf', 'r') as f:
-        main_tf = f.read()
-    
-    main_tf = main_tf.replace(
-        "<Replace with Instructor Access key ID>",
-        credentials["Instructor Access key ID"]
-    ).replace(
-        "<Replace with Instructor Secret access key>",
-        credentials["Instructor Secret access key"]
-    )
-    
-    with open('terraform/main.tf', 'w') as f:
-        f.write(main_tf)
 
+    # Any provider other than terraform is driven through the pool, which
+    # provisions on demand when it has no ready host
+    if POOL_SIZE > 0 or POOL_PROVIDER != TerraformProvider.name:
+        lease_host(credentials)
+        return
+    
     # Apply Terraform configuration
     original_dir = os.getcwd()
     os.chdir('terraform')
     
     try:
-        subprocess.run(["terraform", "init"], check=True)
-        
-        subprocess.run(["terraform", "apply", "-auto-approve"], check=True)
+        # Reuse the long-lived security group and key pool; only the instance is per submission
+        provider = TerraformProvider(credentials, 'main.tf', os.path.join('shared', 'main.tf'))
+        provider.write_shared_vars('.')
+        terraform_init('.')
+
+        # The credentials only reach terraform through its environment
+        subprocess.run(["terraform", "apply", "-auto-approve"], env=terraform_env(credentials), check=True)
     except subprocess.CalledProcessError as e:
         print(f"Terraform error: {e}")
         os.chdir(original_dir)
@@ -46,24 +78,7 @@ def main():
     public_ip = outputs['public_ip']['value']
     private_key_path = outputs['private_key_file']['value']
 
-    # Copy SSH key to inventory
-    key_src = os.path.join('terraform', private_key_path)
-    key_dest = os.path.join('inventory', 'ansible.pem')
-    shutil.copy(key_src, key_dest)
-    os.chmod(key_dest, 0o600)
-
-    # Update inventory file
-    with open('inventory/inventory.ini', 'r') as f:
-        inventory = f.read()
-    
-    inventory = inventory.replace("<public-ip>", public_ip)
-    
-    with open('inventory/inventory.ini', 'w') as f:
-        f.write(inventory)
-
-    print("Setup completed successfully!")
-    print(f"Public IP: {public_ip}")
-    print(f"SSH Key: {key_dest}")
+    install_host(public_ip, os.path.join('terraform', private_key_path))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,178 @@
+import base64
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# Runs in mongosh on the target and prints the whole database state as one JSON document.
+# Documents are serialised with sorted keys and without _id, then sorted, so the
+# digest does not depend on insertion order or generated ids. Dates become {"$date": ISO
+# string} and BSON numbers plain JSON numbers; canonical() below mirrors this.
+STATE_SCRIPT = r'''
+const crypto = require('crypto');
+
+function canonical(value) {
+    if (value instanceof Date) {
+        return '{"$date":' + JSON.stringify(value.toISOString()) + '}';
+    }
+    if (value !== null && typeof value === 'object' && ['Int32', 'Double', 'Long'].includes(value._bsontype)) {
+        return canonical(value._bsontype === 'Long' ? value.toNumber() : value.valueOf());
+    }
+    if (Array.isArray(value)) {
+        return '[' + value.map(canonical).join(',') + ']';
+    }
+    if (value !== null && typeof value === 'object' && value.constructor === Object) {
+        return '{' + Object.keys(value).sort().map(key => JSON.stringify(key) + ':' + canonical(value[key])).join(',') + '}';
+    }
+    return JSON.stringify(value);
+}
+
+const state = {version: db.version(), collections: {}};
+for (const name of db.getCollectionNames().sort()) {
+    const collection = db.getCollection(name);
+    const documents = collection.find({}, {_id: 0}).toArray().map(canonical).sort();
+    state.collections[name] = {
+        count: documents.length,
+        digest: crypto.createHash('sha256').update(documents.join('\n')).digest('hex'),
+        indexes: collection.getIndexes().map(index => ({name: index.name, key: index.key})),
+    };
+}
+print(JSON.stringify(state));
+'''
+
+DEFAULT_INDEX = {"name": "_id_", "key": {"_id": 1}}
+
+# Shell helpers a populate script may call in its documents
+DATE_CALL = re.compile(r'''(?:new\s+Date|ISODate)\(\s*(?:"([^"]*)"|'([^']*)'|(-?\d+))?\s*\)''')
+NUMBER_CALL = re.compile(r'''Number(?:Int|Long)\(\s*(?:"(-?\d+)"|'(-?\d+)'|(-?\d+))\s*\)''')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def state_command(database, port=27017):
+    """One remote command that prints the state of a database."""
+    encoded = base64.b64encode(STATE_SCRIPT.encode()).decode()
+    return f'mongosh --quiet --norc localhost:{port}/{database} --eval "$(echo {encoded} | base64 -d)"'
+
+
+def database_state(transport, database):
+    """Fetch counts, document digests, indexes and server version in one round trip."""
+    out, err = transport.run(state_command(database))
+    if out is None:
+        raise RuntimeError(f"mongosh failed: {err}")
+    return json.loads(out.splitlines()[-1])
+
+
+def iso_date(match):
+    """The {"$date": ...} JSON for a Date or ISODate call, as the state script prints it.
+
+    Like mongosh on a UTC host, a date without an offset is taken as UTC.
+    """
+    text = match.group(1) if match.group(1) is not None else match.group(2)
+    if text is not None:
+        moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+    elif match.group(3) is not None:
+        moment = EPOCH + timedelta(milliseconds=int(match.group(3)))
+    else:
+        raise ValueError("new Date() without an argument has no fixed value")
+    moment = moment.astimezone(timezone.utc)
+    return json.dumps({"$date": moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"})
+
+
+def js_to_json(literal):
+    """Turn the object literals of a populate script into JSON.
+
+    Quotes keys, drops comments and trailing commas, and replaces Date,
+    ISODate, NumberInt and NumberLong calls by the values the state script
+    prints for them.
+    """
+    literal = re.sub(r'//[^\n]*', '', literal)
+    literal = DATE_CALL.sub(iso_date, literal)
+    literal = NUMBER_CALL.sub(lambda match: next(group for group in match.groups() if group is not None), literal)
+    literal = re.sub(r'([{,]\s*)([A-Za-z_$][\w$]*)\s*:', r'\1"\2":', literal)
+    literal = re.sub(r",(\s*[}\]])", r"\1", literal)
+    return json.loads(literal)
+
+
+def js_number(value):
+    """Format a float the way JSON.stringify does: 10.0 is 10, 1e-05 is 0.00001."""
+    if value.is_integer() and abs(value) < 1e21:
+        return str(int(value))
+    sign, digits, exponent = Decimal(repr(value)).normalize().as_tuple()
+    digits = ''.join(map(str, digits))
+    # value = 0.<digits> * 10**point
+    point = len(digits) + exponent
+    if 0 < point <= 21:
+        text = digits[:point] + '.' + digits[point:]
+    elif -6 < point <= 0:
+        text = '0.' + '0' * -point + digits
+    else:
+        mantissa = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '')
+        text = f"{mantissa}e{point - 1:+d}"
+    return ('-' if sign else '') + text
+
+
+def canonical(value):
+    """Serialise a document exactly like canonical() in STATE_SCRIPT."""
+    if isinstance(value, list):
+        return '[' + ','.join(canonical(item) for item in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ','.join(json.dumps(key, ensure_ascii=False) + ':' + canonical(value[key])
+                              for key in sorted(value)) + '}'
+    if isinstance(value, float):
+        return js_number(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def expected_state(script_path):
+    """Work out the collections a populate script leaves behind.
+
+    Understands the deleteMany({}), insertOne, insertMany and createIndex
+    calls such scripts are made of.
+    """
+    with open(script_path, 'r') as f:
+        script = f.read()
+    documents = {}
+    indexes = {}
+    for match in re.finditer(r'db\.(\w+)\.(deleteMany|insertOne|insertMany|createIndex)\((.*?)\);', script, re.S):
+        name, method, argument = match.groups()
+        documents.setdefault(name, [])
+        indexes.setdefault(name, [DEFAULT_INDEX])
+        if method == 'deleteMany':
+            documents[name] = []
+        elif method == 'insertOne':
+            documents[name].append(js_to_json(argument))
+        elif method == 'insertMany':
+            documents[name].extend(js_to_json(argument))
+        else:
+            key = js_to_json(argument.split('}', 1)[0] + '}')
+            indexes[name].append({"name": "_".join(f"{field}_{order}" for field, order in key.items()), "key": key})
+    return {
+        name: {
+            "count": len(docs),
+            "digest": hashlib.sha256("\n".join(sorted(canonical(doc) for doc in docs)).encode()).hexdigest(),
+            "indexes": indexes[name],
+        }
+        for name, docs in documents.items()
+    }
+
+
+def compare_state(expected, actual):
+    """Return the differences between the expected collections and the database state."""
+    problems = []
+    for name, collection in sorted(expected.items()):
+        found = actual["collections"].get(name)
+        if found is None:
+            problems.append(f"collection {name} missing")
+            continue
+        if found["count"] != collection["count"]:
+            problems.append(f"{name} has {found['count']} documents, expected {collection['count']}")
+        elif found["digest"] != collection["digest"]:
+            problems.append(f"{name} documents differ from the populate script")
+        missing = [index["name"] for index in collection["indexes"] if index not in found["indexes"]]
+        if missing:
+            problems.append(f"{name} is missing indexes {', '.join(missing)}")
+    return problems
@@ -0,0 +1,114 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from settings import READINESS_TIMEOUT
+from target import SSH_OPTIONS, parse_inventory
+
+# Exponential backoff between probes of one stage
+INITIAL_DELAY = 0.5
+MAX_DELAY = 8.0
+
+READINESS_FILE = os.path.join('inventory', 'readiness.json')
+
+# cloud-init states after which it no longer touches the host
+CLOUD_INIT_FINISHED = ('done', 'error', 'disabled', 'absent')
+
+CLOUD_INIT_STATUS = (
+    "command -v cloud-init >/dev/null || { echo 'status: absent'; exit 0; }; "
+    "cloud-init status"
+)
+
+# fuser exits 0 while some process still holds one of the locks
+APT_LOCKS_FREE = (
+    "! sudo fuser /var/lib/dpkg/lock-frontend /var/lib/dpkg/lock "
+    "/var/lib/apt/lists/lock /var/cache/apt/archives/lock >/dev/null 2>&1"
+)
+
+
+def ssh(key_path, user, host, command):
+    argv = ["ssh", "-i", key_path, *SSH_OPTIONS, f"{user}@{host}", command]
+    result = subprocess.run(argv, capture_output=True, text=True)
+    return result.returncode, result.stdout.strip()
+
+
+def ssh_ready(key_path, user, host):
+    returncode, _ = ssh(key_path, user, host, "true")
+    return returncode == 0
+
+
+def cloud_init_ready(key_path, user, host):
+    # cloud-init status exits non-zero for "error" and "degraded", so only parse the output
+    _, out = ssh(key_path, user, host, CLOUD_INIT_STATUS)
+    status = out.splitlines()[0].replace('status:', '').strip() if out else None
+    return status in CLOUD_INIT_FINISHED
+
+
+def apt_ready(key_path, user, host):
+    returncode, _ = ssh(key_path, user, host, APT_LOCKS_FREE)
+    return returncode == 0
+
+
+STAGES = [
+    ("ssh", ssh_ready),
+    ("cloud-init", cloud_init_ready),
+    ("apt", apt_ready),
+]
+
+
+def wait_for(probe, deadline):
+    """Poll probe with exponential backoff until it passes or the deadline is hit."""
+    delay = INITIAL_DELAY
+    attempts = 0
+    while True:
+        attempts += 1
+        if probe():
+            return True, attempts
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, attempts
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_DELAY)
+
+
+def wait_until_ready(key_path, user, host, timeout=READINESS_TIMEOUT):
+    """Run every stage in order and return (ready, per-stage timings)."""
+    deadline = time.monotonic() + timeout
+    stages = []
+    for name, probe in STAGES:
+        start = time.monotonic()
+        ready, attempts = wait_for(lambda: probe(key_path, user, host), deadline)
+        stages.append({
+            "stage": name,
+            "ready": ready,
+            "attempts": attempts,
+            "seconds": round(time.monotonic() - start, 2),
+        })
+        print(f"Readiness stage {name}: {'ready' if ready else 'timed out'} "
+              f"after {stages[-1]['seconds']}s ({attempts} probes)")
+        if not ready:
+            return False, stages
+    return True, stages
+
+
+def main():
+    host, user, key_path = parse_inventory()
+    start = time.monotonic()
+    ready, stages = wait_until_ready(key_path, user, host)
+    report = {
+        "host": host,
+        "ready": ready,
+        "seconds": round(time.monotonic() - start, 2),
+        "stages": stages,
+    }
+    with open(READINESS_FILE, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Host {host} {'ready' if ready else 'not ready'} after {report['seconds']}s")
+    return ready
+
+
+if __name__ == "__main__":
+    os.chmod('inventory/ansible.pem', 0o600)
+    sys.exit(0 if main() else 1)
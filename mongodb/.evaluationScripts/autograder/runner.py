@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+EXECUTORS = ("serial", "threads")
+
+
+class Gates:
+    """Existence checks that test cases can require without being graded themselves.
+
+    Each gate is name -> (function, args), with function returning (passed,
+    message) like a verify function. A gate is evaluated once, on first use.
+    """
+
+    def __init__(self, gates=None):
+        self.gates = gates or {}
+        self.passed = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.gates
+
+    def check(self, name):
+        with self.lock:
+            if name not in self.passed:
+                function, args = self.gates[name]
+                try:
+                    self.passed[name] = function(*args)[0]
+                except Exception:
+                    self.passed[name] = False
+            return self.passed[name]
+
+
+def check_requirements(test_cases, gates):
+    """Make sure every prerequisite names a gate or a test case listed earlier, and every "after" a test case."""
+    seen = set()
+    for test in test_cases:
+        for required in test.get("requires", ()):
+            if required not in seen and required not in gates:
+                raise ValueError(f"Test '{test['testid']}' requires '{required}', which is not listed before it")
+        for earlier in test.get("after", ()):
+            if earlier not in seen:
+                raise ValueError(f"Test '{test['testid']}' runs after '{earlier}', which is not listed before it")
+        seen.add(test["testid"])
+
+
+def failed_prerequisite(test, results, gates):
+    """Return the first prerequisite of a test that did not succeed, if any."""
+    for required in test.get("requires", ()):
+        if required in gates:
+            if not gates.check(required):
+                return required
+        elif results[required]["status"] != "success":
+            return required
+    return None
+
+
+def run_test_cases(test_cases, run_test, executor="threads", max_workers=1, gates=None):
+    """Run every test case with run_test and return the results in test_cases order.
+
+    A test case may list the testids or gates it depends on under "requires".
+    When one of them fails, run_test(test, prerequisite) is called instead so
+    the test is marked failed without contacting the host. Testids under
+    "after" only order the runs: the test waits for them to finish but runs
+    whatever their result. Checks of owners,
+    modes or contents belong in test cases, not in gates, so that one wrong
+    detail does not cost the marks of everything after it.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}'")
+    gates = Gates(gates)
+    check_requirements(test_cases, gates)
+    results = {}
+
+    if executor == "serial" or max_workers <= 1:
+        for test in test_cases:
+            prerequisite = failed_prerequisite(test, results, gates)
+            results[test["testid"]] = run_test(test, prerequisite) if prerequisite else run_test(test)
+        return [results[test["testid"]] for test in test_cases]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        waiting = list(test_cases)
+        running = {}
+        while waiting or running:
+            for test in list(waiting):
+                if any(required not in results and required not in gates for required in test.get("requires", ())):
+                    continue
+                if any(earlier not in results for earlier in test.get("after", ())):
+                    continue
+                waiting.remove(test)
+                prerequisite = failed_prerequisite(test, results, gates)
+                if prerequisite:
+                    results[test["testid"]] = run_test(test, prerequisite)
+                else:
+                    running[pool.submit(run_test, test)] = test["testid"]
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+    return [results[test["testid"]] for test in test_cases]
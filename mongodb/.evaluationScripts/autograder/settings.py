@@ -0,0 +1,73 @@
+import os
+
+# "threads" runs independent checks concurrently, "serial" runs them one after another
+EXECUTOR = os.environ.get("GRADER_EXECUTOR", "threads")
+
+# Concurrent checks against the target; kept low so the t2.micro is not overloaded
+MAX_WORKERS = int(os.environ.get("GRADER_MAX_WORKERS", "4"))
+
+# Keeps per-lab state apart when several labs share a grading host
+LAB_NAME = "mongodb"
+
+# Group of inventory.ini that holds the target host
+INVENTORY_GROUP = "DB-server"
+
+# Upper bound for readiness.py to wait for SSH, cloud-init and the apt locks
+READINESS_TIMEOUT = int(os.environ.get("GRADER_READINESS_TIMEOUT", "600"))
+
+# Provider plugins shared by every terraform working directory on this machine
+TERRAFORM_PLUGIN_CACHE = os.environ.get("TF_PLUGIN_CACHE_DIR", "/var/tmp/grader-terraform/plugins")
+TERRAFORM_TIMINGS = os.environ.get("GRADER_TERRAFORM_TIMINGS",
+                                   os.path.join(os.path.dirname(TERRAFORM_PLUGIN_CACHE), "init-timings.jsonl"))
+
+# Security group and key pool kept across submissions, created once per account. They
+# stay until "python pool.py drain" (with a pool) or "python pool.py destroy-shared"
+SHARED_DIR = os.environ.get("GRADER_SHARED_DIR", os.path.join("/var/tmp/grader-shared", LAB_NAME))
+KEY_POOL_SIZE = int(os.environ.get("GRADER_KEY_POOL_SIZE", "4"))
+
+# Warm pool of pre-provisioned targets; 0 provisions a fresh host per submission.
+# POOL_PROVIDER is "terraform", "boto3" (direct EC2 API calls), "container"
+# (local systemd container, no cloud needed) or "fake"
+POOL_SIZE = int(os.environ.get("GRADER_POOL_SIZE", "0"))
+POOL_DIR = os.environ.get("GRADER_POOL_DIR", os.path.join("/var/tmp/grader-pool", LAB_NAME))
+POOL_PROVIDER = os.environ.get("GRADER_POOL_PROVIDER", "terraform")
+
+# Clean and reuse pool hosts after grading instead of destroying them. The submission ran
+# arbitrary tasks as root on the host; recycle.py compares BASELINE_SPEC plus logins,
+# cron, boot hooks and setuid binaries, but cannot rule out e.g. a leftover process or
+# kernel module. Keep this off unless the submissions are trusted.
+RECYCLE = os.environ.get("GRADER_RECYCLE", "0") == "1"
+
+# Facts fingerprinted before the playbook and again after cleanup.sh; a recycled
+# host goes back to the pool only when both fingerprints match
+BASELINE_SPEC = {
+    "paths": ["/var/lib/mongodb", "/var/log/mongodb", "/etc/mongod.conf", "/tmp/populate.js"],
+    "services": ["mongod"],
+    "commands": [
+        "dpkg-query -W -f='${Status} ${Package}\\n' | grep '^install ok installed' | sort",
+        "ls -A /etc/apt/sources.list.d",
+        "ls -A /etc/systemd/system",
+    ],
+    "files": ["/home/ubuntu/.ssh/authorized_keys"],
+}
+
+# Image and runtime for the "container" provider; the image is built from container/ on first use
+CONTAINER_RUNTIME = os.environ.get("GRADER_CONTAINER_RUNTIME", "docker")
+CONTAINER_IMAGE = os.environ.get("GRADER_CONTAINER_IMAGE", "grader-target:22.04")
+
+# "record" saves every remote command and HTTP probe to the cassette, "replay"
+# grades from it with no host and no playbook run
+CASSETTE_MODE = os.environ.get("GRADER_CASSETTE_MODE", "off")
+CASSETTE_FILE = os.environ.get("GRADER_CASSETTE", "cassette.json.gz")
+
+# Playbook output is streamed here, next to evaluate.json, and kept as a grading artifact
+PLAYBOOK_LOG = os.environ.get("GRADER_PLAYBOOK_LOG", os.path.join("..", "playbook.log.gz"))
+PLAYBOOK_LOG_MAX_BYTES = int(os.environ.get("GRADER_PLAYBOOK_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# "tuned" runs the playbook with a generated ansible.cfg (pipelining, forks, fact cache),
+# "default" with the student's own. Fixed per deployment so every submission is graded
+# under the same configuration; "python playbook.py report" compares recorded runs
+ANSIBLE_PROFILE = os.environ.get("GRADER_ANSIBLE_PROFILE", "tuned")
+FACT_CACHE_DIR = os.path.join("inventory", "fact_cache")
+PLAYBOOK_TIMINGS = os.environ.get("GRADER_PLAYBOOK_TIMINGS",
+                                  os.path.join("/var/tmp/grader-timings", LAB_NAME, "playbook.jsonl"))
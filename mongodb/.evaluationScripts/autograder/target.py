@@ -0,0 +1,38 @@
+import configparser
+import os
+
+from settings import INVENTORY_GROUP
+
+# Options of every ssh connection to the target, from the readiness probe and the transports
+SSH_OPTIONS = [
+    "-o", "StrictHostKeyChecking=no",
+    "-o", "BatchMode=yes",
+    "-o", f"ConnectTimeout={os.environ.get('GRADER_SSH_CONNECT_TIMEOUT', '10')}",
+]
+
+
+def parse_inventory():
+    """Parse inventory.ini to get EC2 connection details"""
+    config = configparser.ConfigParser(allow_no_value=True)
+    config.read('inventory/inventory.ini')
+
+    ec2_host = None
+    user = 'ubuntu'
+    key_path = 'inventory/ansible.pem'
+
+    if INVENTORY_GROUP in config:
+        for host in config[INVENTORY_GROUP]:
+            parts = host.split()
+            if parts:
+                ec2_host = parts[0]
+                for param in parts[1:]:
+                    if param.startswith('ansible_user='):
+                        user = param.split('=')[1]
+                    elif param.startswith('ansible_ssh_private_key_file='):
+                        key_path = param.split('=')[1]
+                break
+
+    if not ec2_host:
+        raise ValueError(f"EC2 host not found in inventory.ini under [{INVENTORY_GROUP}] group.")
+
+    return ec2_host, user, key_path
@@ -1,68 +1,46 @@
-provider "aws" {
-  access_key = "<Replace with Instructor Access key ID>"
-  secret_key = "<Replace with Instructor Secret access key>"
-  region     = "us-east-1"
+# Instructor credentials, passed by the grader as TF_VAR_access_key and TF_VAR_secret_key
+variable "access_key" {
+  type      = string
+  sensitive = true
 }
 
-# Generate random suffix
-resource "random_id" "suffix" {
-  byte_length = 4
+variable "secret_key" {
+  type      = string
+  sensitive = true
 }
 
-# Generate SSH key pair
-resource "tls_private_key" "instance_key" {
-  algorithm = "RSA"
-  rsa_bits  = 4096
+provider "aws" {
+  access_key = var.access_key
+  secret_key = var.secret_key
+  region     = "us-east-1"
 }
 
-# Create AWS key pair
-resource "aws_key_pair" "instance_key" {
-  key_name   = "instance-key-${random_id.suffix.hex}"
-  public_key = tls_private_key.instance_key.public_key_openssh
-}
+# Key pair and security group come from the long-lived stack in shared/;
+# init.py writes their values to shared.auto.tfvars.json
 
-# Save private key to local file
-resource "local_file" "private_key" {
-  content         = tls_private_key.instance_key.private_key_pem
-  filename        = "${path.module}/instance-key-${random_id.suffix.hex}.pem"
-  file_permission = "0600"
+variable "key_name" {
+  type = string
 }
 
-# Security group configuration
-resource "aws_security_group" "web_sg" {
-  name        = "web-sg-${random_id.suffix.hex}"
-  description = "Allow SSH, HTTP"
-
-  ingress {
-    description = "SSH"
-    from_port   = 22
-    to_port     = 22
-    protocol    = "tcp"
-    cidr_blocks = ["0.0.0.0/0"]
-  }
+variable "security_group_name" {
+  type = string
+}
 
-  ingress {
-    description = "HTTP"
-    from_port   = 80
-    to_port     = 80
-    protocol    = "tcp"
-    cidr_blocks = ["0.0.0.0/0"]
-  }
+variable "private_key_file" {
+  type = string
+}
 
-  egress {
-    from_port   = 0
-    to_port     = 0
-    protocol    = "-1"
-    cidr_blocks = ["0.0.0.0/0"]
-  }
+# Generate random suffix
+resource "random_id" "suffix" {
+  byte_length = 4
 }
 
 # EC2 Instance
 resource "aws_instance" "web_server" {
   ami             = "ami-0f9de6e2d2f067fca"
   instance_type   = "t2.micro"
-  key_name        = aws_key_pair.instance_key.key_name
-  security_groups = [aws_security_group.web_sg.name]
+  key_name        = var.key_name
+  security_groups = [var.security_group_name]
 
   tags = {
     Name = "ubuntu-web-server-${random_id.suffix.hex}"
@@ -74,5 +52,5 @@ output "public_ip" {
 }
 
 output "private_key_file" {
-  value = local_file.private_key.filename
-}
\ No newline at end of file
+  value = var.private_key_file
+}
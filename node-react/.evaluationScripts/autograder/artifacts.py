@@ -0,0 +1,72 @@
+import hashlib
+import os
+
+from cassette import http_get
+from settings import ARTIFACT_HTTP_CHECK
+
+# Served files compared over HTTP; images and fonts are left to the manifest
+TEXT_EXTENSIONS = ('.html', '.js', '.css', '.json', '.txt', '.map')
+
+# Paths listed per kind of difference in a failure message
+LISTED_PATHS = 5
+
+
+def compare_manifests(expected, actual):
+    """Return the files missing from, extra in and stale in the actual tree."""
+    expected_files, actual_files = expected["files"], actual["files"]
+    return {
+        "missing": sorted(set(expected_files) - set(actual_files)),
+        "extra": sorted(set(actual_files) - set(expected_files)),
+        "stale": sorted(path for path in set(expected_files) & set(actual_files)
+                        if expected_files[path] != actual_files[path]),
+    }
+
+
+def describe_differences(differences):
+    parts = []
+    for kind, paths in differences.items():
+        if paths:
+            listed = ", ".join(paths[:LISTED_PATHS]) + (", ..." if len(paths) > LISTED_PATHS else "")
+            parts.append(f"{len(paths)} {kind} ({listed})")
+    return "; ".join(parts)
+
+
+def served_url(base_url, path):
+    return base_url + ('/' if path == 'index.html' else '/' + path)
+
+
+def verify_served_files(manifest, base_url):
+    """Check that nginx serves the deployed bytes of every text asset."""
+    for path, digest in sorted(manifest["files"].items()):
+        if not path.endswith(TEXT_EXTENSIONS):
+            continue
+        url = served_url(base_url, path)
+        try:
+            response = http_get(url, timeout=10)
+        except Exception as e:
+            return False, f"Failed to fetch {url}: {e}"
+        if response.status_code != 200 or hashlib.sha256(response.content).hexdigest() != digest:
+            return False, f"{url} does not serve the deployed {path}"
+    return True, "Served files match the deployed build"
+
+
+def verify_deployed_tree(transport, source, target, base_url=None):
+    """Compare the hash manifests of a build tree and its deployed copy in one agent batch.
+
+    Equal Merkle roots settle the check without looking at single files; on a
+    difference the per-file digests name what is missing, extra or stale. With
+    base_url, and ARTIFACT_HTTP_CHECK on, the served text assets are checked too.
+    """
+    expected, actual = transport.batch([("manifest", source), ("manifest", target)])
+    if expected is None:
+        return False, f"{source} missing"
+    if actual is None:
+        return False, f"{target} missing"
+    if not actual["files"]:
+        return False, f"{target} is empty"
+    if expected["root"] != actual["root"]:
+        differences = describe_differences(compare_manifests(expected, actual)) or "directory layout differs"
+        return False, f"{target} differs from {os.path.basename(source)}: {differences}"
+    if base_url and ARTIFACT_HTTP_CHECK:
+        return verify_served_files(actual, base_url)
+    return True, f"{target} matches {source} ({len(actual['files'])} files)"
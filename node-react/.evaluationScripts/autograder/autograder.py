@@ -1,253 +1,190 @@
 import json
 import os
-import subprocess
-import requests
-import configparser
+from target import parse_inventory
+from transport import HostUnreachable, get_transport, close_transports, transport_summary
+from facts import get_facts
+from configfiles import verify_config_file
+from artifacts import verify_deployed_tree
+from workers import verify_requests_spread, verify_workers_active, worker_ports
+from webperf import verify_cache_headers, verify_compressed_assets
+from runner import run_test_cases
+from settings import EXECUTOR, MAX_WORKERS, LOAD_TEST, LOAD_TARGETS, LOAD_THRESHOLDS
+from loadtest import load_reports, verify_load
+from recycle import record_baseline
+from playbook import FACTS_PLAYBOOK, run_playbook, playbook_profile
+from cassette import CASSETTE, http_get, save_cassette
 
-def execute_command(command):
-    """Execute a shell command and return the output and error."""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            executable='/bin/bash'
-        )
-        return result.stdout.strip(), None
-    except subprocess.CalledProcessError as e:
-        return None, f"Error: {e.stderr.strip()}"
-
-def parse_inventory():
-    """Parse inventory.ini to get EC2 connection details"""
-    config = configparser.ConfigParser(allow_no_value=True)
-    config.read('inventory/inventory.ini')
-    
-    ec2_host = None
-    user = 'ubuntu'
-    key_path = 'inventory/ansible.pem'
-    
-    if 'webserver' in config:
-        for host in config['webserver']:
-            parts = host.split()
-            if parts:
-                ec2_host = parts[0]
-                for param in parts[1:]:
-                    if param.startswith('ansible_user='):
-                        user = param.split('=')[1]
-                    elif param.startswith('ansible_ssh_private_key_file='):
-                        key_path = param.split('=')[1]
-                break
-    
-    if not ec2_host:
-        raise ValueError("EC2 host not found in inventory.ini")
-    
-    return ec2_host, user, key_path
+PREREQUISITE_PACKAGES = ['curl', 'ca-certificates', 'gnupg', 'nginx']
+
+# Everything the checks inspect, collected from the host in one round trip
+FACT_SPEC = {
+    "paths": [
+        "/etc/apt/sources.list.d/nodesource.list",
+        "/home/ubuntu/app",
+        "/home/ubuntu/app/app.js",
+        "/home/ubuntu/app/package.json",
+        "/home/ubuntu/app/node_modules",
+        "/etc/systemd/system/node_app@.service",
+        "/home/ubuntu/react-app",
+        "/home/ubuntu/react-app/package.json",
+        "/home/ubuntu/react-app/src",
+        "/home/ubuntu/react-app/node_modules",
+        "/home/ubuntu/react-app/build",
+        "/var/www/react-app",
+        "/var/www/react-app/index.html",
+        "/etc/nginx/sites-available/react_node.conf",
+        "/etc/nginx/sites-enabled/react_node.conf",
+        "/etc/nginx/sites-enabled/default",
+    ],
+    "packages": PREREQUISITE_PACKAGES,
+    "services": ["nginx"],
+    "commands": ["node --version", "npm --version"],
+}
 
 def run_remote_command(command, key_path, user, host):
-    """Execute a command on the EC2 instance via SSH"""
-    ssh_cmd = f"ssh -i {key_path} -o StrictHostKeyChecking=no {user}@{host} '{command}'"
-    return execute_command(ssh_cmd)
+    """Execute a command on the EC2 instance over the shared SSH transport"""
+    return get_transport(key_path, user, host).run(command)
+
+def host_facts(key_path, user, host):
+    """Return the fact snapshot of the EC2 instance"""
+    return get_facts(key_path, user, host, FACT_SPEC)
+
+def verify_path_exists(key_path, user, host, flag, path):
+    """Gate: a file test on a path, without looking at owner, mode or content"""
+    if host_facts(key_path, user, host).test(flag, path):
+        return True, f"{path} present"
+    return False, f"{path} missing"
 
 def verify_prerequisites(key_path, user, host):
     """Verify required packages are installed"""
-    packages = ['curl', 'ca-certificates', 'gnupg', 'nginx']
-    for pkg in packages:
-        out, err = run_remote_command(f"dpkg -s {pkg}", key_path, user, host)
-        if not out or 'Status: install ok installed' not in out:
+    facts = host_facts(key_path, user, host)
+    for pkg in PREREQUISITE_PACKAGES:
+        if not facts.package_installed(pkg):
             return False, f"{pkg} not installed"
     return True, "All prerequisites installed"
 
 def verify_nodesource_repo(key_path, user, host):
     """Verify NodeSource repository exists"""
-    out, err = run_remote_command(
-        "[ -f /etc/apt/sources.list.d/nodesource.list ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    if not host_facts(key_path, user, host).test('-f', '/etc/apt/sources.list.d/nodesource.list'):
         return False, "NodeSource repo file missing"
     return True, "NodeSource repo configured"
 
 def verify_nodejs_installed(key_path, user, host):
     """Verify Node.js version 22.x"""
-    out, err = run_remote_command("node --version", key_path, user, host)
+    out, err = host_facts(key_path, user, host).command("node --version")
     if out and out.startswith('v22.'):
         return True, f"Node.js {out} installed"
     return False, "Node.js 22.x not installed"
 
 def verify_npm_version(key_path, user, host):
     """Verify npm version 10.9.2"""
-    out, err = run_remote_command("npm --version", key_path, user, host)
+    out, err = host_facts(key_path, user, host).command("npm --version")
     if out and out == '10.9.2':
         return True, f"npm {out} installed"
     return False, "npm 10.9.2 not installed"
 
 def verify_app_directory(key_path, user, host):
     """Verify Node.js app directory permissions"""
-    out, err = run_remote_command(
-        "[ -d /home/ubuntu/app ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    facts = host_facts(key_path, user, host)
+    if not facts.test('-d', '/home/ubuntu/app'):
         return False, "Node.js app directory missing"
-    out, err = run_remote_command(
-        'stat -c "%U:%G %a" /home/ubuntu/app',
-        key_path, user, host
-    )
+    out = facts.stat('/home/ubuntu/app', '%U:%G %a')
     if out == 'ubuntu:ubuntu 755':
         return True, "Node.js app directory configured"
     return False, f"Invalid permissions: {out}"
 
 def verify_app_files(key_path, user, host):
     """Verify Node.js application files copied"""
-    out, err = run_remote_command(
-        "[ -f /home/ubuntu/app/app.js ] && [ -f /home/ubuntu/app/package.json ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    facts = host_facts(key_path, user, host)
+    if facts.test('-f', '/home/ubuntu/app/app.js') and facts.test('-f', '/home/ubuntu/app/package.json'):
         return True, "Node.js files present"
     return False, "Missing Node.js files"
 
 def verify_dependencies(key_path, user, host):
     """Verify Node.js dependencies installed"""
-    out, err = run_remote_command(
-        "test -d /home/ubuntu/app/node_modules && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    if host_facts(key_path, user, host).test('-d', '/home/ubuntu/app/node_modules'):
         return True, "Node.js dependencies installed"
     return False, "Node.js node_modules missing"
 
 def verify_systemd_service(key_path, user, host):
-    """Verify systemd service file exists"""
-    out, err = run_remote_command(
-        "[ -f /etc/systemd/system/node_app.service ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
-        return True, "Systemd service created"
-    return False, "Systemd service missing"
+    """Verify the templated systemd unit matches the role's copy"""
+    if not host_facts(key_path, user, host).test('-f', '/etc/systemd/system/node_app@.service'):
+        return False, "Systemd service missing"
+    return verify_config_file(get_transport(key_path, user, host), host, '/etc/systemd/system/node_app@.service',
+                              'roles/deploy_node_app/files/node_app@.service', 'deploy_node_app')
 
 def verify_service_running(key_path, user, host):
-    """Verify Node.js service is active"""
-    out_active, err = run_remote_command(
-        "systemctl is-active node_app",
-        key_path, user, host
-    )
-    out_enabled, err = run_remote_command(
-        "systemctl is-enabled node_app",
-        key_path, user, host
-    )
-    if out_active == 'active' and out_enabled == 'enabled':
-        return True, "Service running and enabled"
-    return False, f"Service state: active={out_active}, enabled={out_enabled}"
+    """Verify every expected Node.js worker is active and enabled"""
+    return verify_workers_active(get_transport(key_path, user, host), 'node_app', worker_ports())
 
 def verify_react_app_directory(key_path, user, host):
     """Verify React app directory exists"""
-    out, err = run_remote_command(
-        "[ -d /home/ubuntu/react-app ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    facts = host_facts(key_path, user, host)
+    if not facts.test('-d', '/home/ubuntu/react-app'):
         return False, "React app directory missing"
-    out, err = run_remote_command(
-        'stat -c "%U:%G %a" /home/ubuntu/react-app',
-        key_path, user, host
-    )
+    out = facts.stat('/home/ubuntu/react-app', '%U:%G %a')
     if out == 'ubuntu:ubuntu 755':
         return True, "React app directory configured"
     return False, f"Invalid permissions: {out}"
 
 def verify_react_files_copied(key_path, user, host):
     """Verify React files copied"""
-    out, err = run_remote_command(
-        "[ -f /home/ubuntu/react-app/package.json ] && [ -d /home/ubuntu/react-app/src ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    facts = host_facts(key_path, user, host)
+    if facts.test('-f', '/home/ubuntu/react-app/package.json') and facts.test('-d', '/home/ubuntu/react-app/src'):
         return True, "React files present"
     return False, "Missing React files"
 
 def verify_react_dependencies(key_path, user, host):
     """Verify React dependencies installed"""
-    out, err = run_remote_command(
-        "test -d /home/ubuntu/react-app/node_modules && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    if host_facts(key_path, user, host).test('-d', '/home/ubuntu/react-app/node_modules'):
         return True, "React dependencies installed"
     return False, "React node_modules missing"
 
 def verify_react_build_directory(key_path, user, host):
     """Verify React build directory exists"""
-    out, err = run_remote_command(
-        "[ -d /home/ubuntu/react-app/build ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    if host_facts(key_path, user, host).test('-d', '/home/ubuntu/react-app/build'):
         return True, "React build directory exists"
     return False, "React build directory missing"
 
 def verify_react_static_directory(key_path, user, host):
     """Verify static files directory"""
-    out, err = run_remote_command(
-        "[ -d /var/www/react-app ] && echo exists",
-        key_path, user, host
-    )
-    if out != "exists":
+    facts = host_facts(key_path, user, host)
+    if not facts.test('-d', '/var/www/react-app'):
         return False, "Static directory missing"
-    out, err = run_remote_command(
-        'stat -c "%U:%G %a" /var/www/react-app',
-        key_path, user, host
-    )
+    out = facts.stat('/var/www/react-app', '%U:%G %a')
     if out == 'ubuntu:ubuntu 755':
         return True, "Static directory configured"
     return False, f"Invalid permissions: {out}"
 
 def verify_react_build_deployed(key_path, user, host):
-    """Verify React build deployed"""
-    out, err = run_remote_command(
-        "[ -f /var/www/react-app/index.html ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
-        return True, "React build deployed"
-    return False, "React build files missing"
+    """Verify the deployed React build matches the build output file for file"""
+    if not host_facts(key_path, user, host).test('-f', '/var/www/react-app/index.html'):
+        return False, "React build files missing"
+    return verify_deployed_tree(get_transport(key_path, user, host), '/home/ubuntu/react-app/build',
+                                '/var/www/react-app', f"http://{host}")
 
 def verify_nginx_config(key_path, user, host):
     """Verify Nginx configuration"""
-    out, err = run_remote_command(
-        "[ -f /etc/nginx/sites-available/react_node.conf ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
-        return True, "Nginx config present"
-    return False, "Nginx config missing"
+    if not host_facts(key_path, user, host).test('-f', '/etc/nginx/sites-available/react_node.conf'):
+        return False, "Nginx config missing"
+    return verify_config_file(get_transport(key_path, user, host), host, '/etc/nginx/sites-available/react_node.conf',
+                              'roles/deploy_node_app/templates/react_node.conf.j2', 'deploy_node_app')
 
 def verify_nginx_site_enabled(key_path, user, host):
     """Verify Nginx site enabled"""
-    out, err = run_remote_command(
-        "[ -L /etc/nginx/sites-enabled/react_node.conf ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    if host_facts(key_path, user, host).test('-L', '/etc/nginx/sites-enabled/react_node.conf'):
         return True, "Nginx site enabled"
     return False, "Nginx site not enabled"
 
 def verify_nginx_default_site_removed(key_path, user, host):
     """Verify default Nginx site removed"""
-    out, err = run_remote_command(
-        "[ ! -f /etc/nginx/sites-enabled/default ] && echo exists",
-        key_path, user, host
-    )
-    if out == 'exists':
+    if not host_facts(key_path, user, host).test('-f', '/etc/nginx/sites-enabled/default'):
         return True, "Default site removed"
     return False, "Default site present"
 
 def verify_nginx_running(key_path, user, host):
     """Verify Nginx service status"""
-    out, err = run_remote_command("systemctl is-active nginx", key_path, user, host)
+    out = host_facts(key_path, user, host).service("nginx")["active"]
     if out == 'active':
         return True, "Nginx running"
     return False, f"Nginx not running: {out}"
@@ -255,26 +192,68 @@ def verify_nginx_running(key_path, user, host):
 def verify_api_proxy(host):
     """Verify API accessible via Nginx proxy"""
     try:
-        response = requests.get(f"http://{host}/api", timeout=5)
+        response = http_get(f"http://{host}/api", timeout=5)
         if response.text.strip() == 'Node-Express App using Ansible':
             return True, "API accessible via Nginx"
         return False, "Unexpected API response"
     except Exception as e:
         return False, f"API connection failed: {str(e)}"
 
+def verify_api_balanced(host):
+    """Verify Nginx spreads API requests across all Node.js workers"""
+    return verify_requests_spread(f"http://{host}/api", worker_ports())
+
 def verify_react_frontend(host):
     """Verify React frontend accessible"""
     try:
-        response = requests.get(f"http://{host}", timeout=5)
+        response = http_get(f"http://{host}", timeout=5)
         if '<div id="root"></div>' in response.text:
             return True, "React frontend served"
         return False, "React content not found"
     except Exception as e:
         return False, f"Frontend connection failed: {str(e)}"
 
+def verify_asset_compression(host):
+    """Verify Nginx serves the React bundles gzip-compressed"""
+    return verify_compressed_assets(f"http://{host}")
+
+def verify_asset_caching(host):
+    """Verify hashed React assets are cached long-term and index.html is revalidated"""
+    return verify_cache_headers(f"http://{host}")
+
+def verify_load_test(host):
+    """Verify the nginx -> node stack keeps up with concurrent requests"""
+    return verify_load("app", f"http://{host}", LOAD_TARGETS, LOAD_THRESHOLDS)
+
+def run_test(test, prerequisite=None):
+    """Run one test case and build its evaluate.json entry"""
+    test_result = {
+        "testid": test["testid"],
+        "status": "failure",
+        "score": 0,
+        "maximum marks": test["maximum_marks"],
+        "message": ""
+    }
+
+    if prerequisite:
+        test_result["message"] = f"Skipped: prerequisite '{prerequisite}' failed"
+        return test_result
+
+    try:
+        success, message = test["verify_function"](*test["args"])
+        if success:
+            test_result["status"] = "success"
+            test_result["score"] = test["maximum_marks"]
+        test_result["message"] = message
+    except HostUnreachable as e:
+        test_result["message"] = str(e)
+    except Exception as e:
+        test_result["message"] = f"Verification error: {str(e)}"
+
+    return test_result
+
 def main():
     overall = {"data": []}
-    data = []
     
     try:
         ec2_host, user, key_path = parse_inventory()
@@ -291,9 +270,27 @@ def main():
             json.dump(overall, f, indent=4)
         return
 
-    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml"
-    pb_out, pb_err = execute_command(playbook_cmd)
+    record_baseline()
+
+    playbook_cmd = f"ANSIBLE_HOST_KEY_CHECKING=False ansible-playbook -i inventory/inventory.ini playbook.yml {FACTS_PLAYBOOK}"
+    profile = None
+    if not CASSETTE.replaying:
+        returncode, tail, run = run_playbook(playbook_cmd)
+        if returncode != 0:
+            print(f"ansible-playbook exited with {returncode}, last lines of output:")
+            print("\n".join(tail))
+        profile = playbook_profile(run)
     
+    # Existence-only prerequisites; they skip dependent checks but carry no marks
+    gates = {
+        "Node.js app directory present": (verify_path_exists, (key_path, user, ec2_host, '-d', '/home/ubuntu/app')),
+        "systemd unit present": (verify_path_exists, (key_path, user, ec2_host, '-f', '/etc/systemd/system/node_app@.service')),
+        "React app directory present": (verify_path_exists, (key_path, user, ec2_host, '-d', '/home/ubuntu/react-app')),
+        "Static directory present": (verify_path_exists, (key_path, user, ec2_host, '-d', '/var/www/react-app')),
+        "React build deployed": (verify_path_exists, (key_path, user, ec2_host, '-f', '/var/www/react-app/index.html')),
+        "Nginx config present": (verify_path_exists, (key_path, user, ec2_host, '-f', '/etc/nginx/sites-available/react_node.conf')),
+    }
+
     test_cases = [
         {
             "testid": "Install prerequisites",
@@ -329,12 +326,14 @@ def main():
             "testid": "Copy Node.js files",
             "verify_function": verify_app_files,
             "args": (key_path, user, ec2_host),
+            "requires": ["Node.js app directory present"],
             "maximum_marks": 1
         },
         {
             "testid": "Install Node.js dependencies",
             "verify_function": verify_dependencies,
             "args": (key_path, user, ec2_host),
+            "requires": ["Copy Node.js files"],
             "maximum_marks": 1
         },
         {
@@ -347,6 +346,7 @@ def main():
             "testid": "Enable Node.js service",
             "verify_function": verify_service_running,
             "args": (key_path, user, ec2_host),
+            "requires": ["systemd unit present"],
             "maximum_marks": 1
         },
         {
@@ -359,18 +359,21 @@ def main():
             "testid": "Copy React files",
             "verify_function": verify_react_files_copied,
             "args": (key_path, user, ec2_host),
+            "requires": ["React app directory present"],
             "maximum_marks": 1
         },
         {
             "testid": "Install React dependencies",
             "verify_function": verify_react_dependencies,
             "args": (key_path, user, ec2_host),
+            "requires": ["Copy React files"],
             "maximum_marks": 1
         },
         {
             "testid": "Build React application",
             "verify_function": verify_react_build_directory,
             "args": (key_path, user, ec2_host),
+            "requires": ["Install React dependencies"],
             "maximum_marks": 1
         },
         {
@@ -383,6 +386,7 @@ def main():
             "testid": "Deploy React build",
             "verify_function": verify_react_build_deployed,
             "args": (key_path, user, ec2_host),
+            "requires": ["Static directory present", "Build React application"],
             "maximum_marks": 1
         },
         {
@@ -395,6 +399,7 @@ def main():
             "testid": "Enable Nginx site",
             "verify_function": verify_nginx_site_enabled,
             "args": (key_path, user, ec2_host),
+            "requires": ["Nginx config present"],
             "maximum_marks": 1
         },
         {
@@ -413,40 +418,63 @@ def main():
             "testid": "API accessibility",
             "verify_function": verify_api_proxy,
             "args": (ec2_host,),
+            "requires": ["systemd unit present", "Nginx service status"],
+            "maximum_marks": 1
+        },
+        {
+            "testid": "API load balancing",
+            "verify_function": verify_api_balanced,
+            "args": (ec2_host,),
+            "requires": ["API accessibility"],
             "maximum_marks": 1
         },
         {
             "testid": "React frontend accessibility",
             "verify_function": verify_react_frontend,
             "args": (ec2_host,),
+            "requires": ["React build deployed", "Nginx service status"],
+            "maximum_marks": 1
+        },
+        {
+            "testid": "Static asset compression",
+            "verify_function": verify_asset_compression,
+            "args": (ec2_host,),
+            "requires": ["React frontend accessibility"],
+            "maximum_marks": 1
+        },
+        {
+            "testid": "Static asset caching",
+            "verify_function": verify_asset_caching,
+            "args": (ec2_host,),
+            "requires": ["React frontend accessibility"],
             "maximum_marks": 1
         }
     ]
+    if LOAD_TEST:
+        test_cases.append({
+            "testid": "Load test",
+            "verify_function": verify_load_test,
+            "args": (ec2_host,),
+            "requires": ["API accessibility", "React frontend accessibility"],
+            "maximum_marks": 1
+        })
 
-    for test in test_cases:
-        test_result = {
-            "testid": test["testid"],
-            "status": "failure",
-            "score": 0,
-            "maximum marks": test["maximum_marks"],
-            "message": ""
-        }
-
-        try:
-            success, message = test["verify_function"](*test["args"])
-            if success:
-                test_result["status"] = "success"
-                test_result["score"] = test["maximum_marks"]
-            test_result["message"] = message
-        except Exception as e:
-            test_result["message"] = f"Verification error: {str(e)}"
-        
-        data.append(test_result)
+    data = run_test_cases(test_cases, run_test, EXECUTOR, MAX_WORKERS, gates)
 
     overall['data'] = data
+    if profile:
+        overall['playbook_profile'] = profile
+    reports = load_reports()
+    if reports:
+        overall['load_test'] = reports
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
 
 if __name__ == "__main__":
     os.chmod('inventory/ansible.pem', 0o600)
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        close_transports()
+        save_cassette()
+        print(transport_summary())
\ No newline at end of file
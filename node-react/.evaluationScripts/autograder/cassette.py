@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import threading
+from urllib.parse import urlsplit
+
+from settings import CASSETTE_FILE, CASSETTE_MODE
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a probe the cassette has no recording of."""
+
+
+class ReplayedError(Exception):
+    """Stands in for the exception a probe raised while recording; str() matches it."""
+
+
+class Cassette:
+    """Recorded results of remote commands and HTTP requests, keyed by probe.
+
+    A probe repeated during a run keeps every result, and replay serves them
+    back in the same order, repeating the last one once they run out.
+    """
+
+    def __init__(self, path, mode):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.replayed = {}
+        if mode == "replay":
+            with gzip.open(path, 'rt') as f:
+                self.entries = json.load(f)["entries"]
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def record(self, kind, key, result):
+        with self.lock:
+            self.entries.setdefault(f"{kind} {key}", []).append(result)
+
+    def replay(self, kind, key):
+        entry = f"{kind} {key}"
+        with self.lock:
+            results = self.entries.get(entry)
+            if not results:
+                raise CassetteMiss(f"No recording for {kind} probe {key[:80]!r}")
+            index = self.replayed.get(entry, 0)
+            self.replayed[entry] = index + 1
+            return results[min(index, len(results) - 1)]
+
+    def save(self):
+        if not self.recording:
+            return
+        with self.lock:
+            with gzip.open(self.path, 'wt') as f:
+                json.dump({"version": 1, "entries": self.entries}, f, separators=(',', ':'))
+        print(f"Recorded {len(self.entries)} probes to {self.path}")
+
+
+def command_key(command):
+    """Commands such as agent invocations are long, so they are stored by hash."""
+    return hashlib.sha256(command.encode()).hexdigest()
+
+
+class CassetteResponse:
+    """The parts of a requests.Response the checks read, rebuilt from a recording."""
+
+    def __init__(self, recorded):
+        from requests.structures import CaseInsensitiveDict
+        self.status_code = recorded["status_code"]
+        self.text = recorded["text"]
+        self.headers = CaseInsensitiveDict(recorded["headers"])
+        self.encoding = recorded.get("encoding") or 'utf-8'
+
+    @property
+    def content(self):
+        return self.text.encode(self.encoding)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def request_key(url, headers=None):
+    """Key a request by path and headers only, so a cassette replays against any host address."""
+    parts = urlsplit(url)
+    key = parts.path or '/'
+    if parts.query:
+        key += '?' + parts.query
+    if headers:
+        key += ' ' + json.dumps(headers, sort_keys=True)
+    return key
+
+
+def http_get(url, **kwargs):
+    """requests.get that is recorded to, or replayed from, the cassette."""
+    key = request_key(url, kwargs.get("headers"))
+    if CASSETTE.replaying:
+        recorded = CASSETTE.replay("GET", key)
+        if "error" in recorded:
+            raise ReplayedError(recorded["error"])
+        return CassetteResponse(recorded)
+
+    import requests
+    try:
+        response = requests.get(url, **kwargs)
+    except Exception as e:
+        if CASSETTE.recording:
+            CASSETTE.record("GET", key, {"error": str(e)})
+        raise
+    if CASSETTE.recording:
+        CASSETTE.record("GET", key, {
+            "status_code": response.status_code,
+            "text": response.text,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+        })
+    return response
+
+
+CASSETTE = Cassette(CASSETTE_FILE, CASSETTE_MODE)
+
+
+def save_cassette():
+    CASSETTE.save()
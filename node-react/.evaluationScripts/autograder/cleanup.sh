@@ -0,0 +1,29 @@
+#! /bin/bash
+# Return a used target to its pre-grading state so the pool can hand it out again.
+# Runs as root on the target; reset.py checks the result against the baseline fingerprint.
+set -e
+export DEBIAN_FRONTEND=noninteractive
+
+purge_packages() {
+    local packages=""
+    for pattern in "$@"; do
+        packages="$packages $(dpkg-query -W -f='${binary:Package}\n' "$pattern" 2>/dev/null || true)"
+    done
+    if [ -n "${packages// }" ]; then
+        apt-get purge -y $packages
+    fi
+}
+
+for unit in $(systemctl list-units --all --plain --no-legend 'node_app@*' | awk '{print $1}'); do
+    systemctl disable --now "$unit" || true
+done
+rm -f /etc/systemd/system/node_app@.service /etc/systemd/system/multi-user.target.wants/node_app@*.service
+systemctl stop nginx || true
+purge_packages nodejs 'nginx*' 'libnginx*'
+apt-get autoremove -y --purge
+
+rm -rf /home/ubuntu/app /home/ubuntu/react-app /var/www /etc/nginx /var/log/nginx
+rm -rf /usr/lib/node_modules /usr/bin/npm /usr/bin/npx
+rm -f /etc/apt/sources.list.d/nodesource.list /usr/share/keyrings/nodesource.gpg /etc/apt/keyrings/nodesource.gpg
+rm -rf /home/ubuntu/.npm /home/ubuntu/.ansible /root/.npm /root/.ansible
+systemctl daemon-reload
@@ -0,0 +1,144 @@
+import difflib
+import hashlib
+import os
+
+import jinja2
+import yaml
+
+from facts import read_fact_cache
+
+# Passes over variables whose values are themselves templates, like Ansible's lazy lookups
+RESOLVE_PASSES = 5
+
+# Lines of unified diff kept in a failure message
+DIFF_LINES = 20
+
+
+def load_yaml(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_vars_dir(directory, name):
+    """Variables from <directory>/<name>, <name>.yml or <name>.yaml, as Ansible looks them up."""
+    variables = {}
+    for candidate in (name, f"{name}.yml", f"{name}.yaml"):
+        path = os.path.join(directory, candidate)
+        if os.path.isfile(path):
+            variables.update(load_yaml(path))
+    return variables
+
+
+def play_for_role(role, playbook):
+    """Return the play of the playbook that applies a role."""
+    for play in load_yaml(playbook) or []:
+        for entry in play.get("roles", []):
+            if (entry.get("role") if isinstance(entry, dict) else entry) == role:
+                return play
+    return {}
+
+
+def fact_variables(host):
+    """Facts cached during the playbook run, both as ansible_facts and as ansible_* variables."""
+    cache = read_fact_cache(host)
+    facts = {key[len("ansible_"):] if key.startswith("ansible_") else key: value for key, value in cache.items()}
+    return dict(cache, ansible_facts=facts)
+
+
+def role_variables(role, host, playbook='playbook.yml'):
+    """Collect the variables Ansible would render a role's templates with.
+
+    Covers, from lowest to highest precedence: cached facts, role defaults,
+    group_vars for all and for the play's hosts, play vars and role vars.
+    """
+    play = play_for_role(role, playbook)
+    defined = load_vars_dir(os.path.join('roles', role, 'defaults'), 'main')
+    defined.update(load_vars_dir('group_vars', 'all'))
+    for group in str(play.get("hosts", "")).split(':'):
+        if group and group != 'all':
+            defined.update(load_vars_dir('group_vars', group))
+    defined.update(play.get("vars") or {})
+    defined.update(load_vars_dir(os.path.join('roles', role, 'vars'), 'main'))
+
+    variables = fact_variables(host)
+    variables["inventory_hostname"] = host
+    variables.update(defined)
+    resolve(variables, defined)
+    return variables
+
+
+def template_environment():
+    """A Jinja2 environment with the options and core filters of Ansible's template module."""
+    environment = jinja2.Environment(trim_blocks=True, keep_trailing_newline=True,
+                                     undefined=jinja2.StrictUndefined)
+    try:
+        from ansible.plugins.filter.core import FilterModule
+        environment.filters.update(FilterModule().filters())
+    except ImportError:
+        pass
+    return environment
+
+
+def resolve(variables, names):
+    """Render the variables in names whose values refer to other variables."""
+    environment = template_environment()
+    for _ in range(RESOLVE_PASSES):
+        changed = False
+        for name in names:
+            value = variables[name]
+            if isinstance(value, str) and '{{' in value:
+                rendered = environment.from_string(value).render(variables)
+                changed = changed or rendered != value
+                variables[name] = rendered
+        if not changed:
+            break
+
+
+def render_template(path, variables):
+    with open(path, 'r') as f:
+        source = f.read()
+    return template_environment().from_string(source).render(variables)
+
+
+def expected_content(source, role, host):
+    """The content a role deploys from source: rendered if it is a template, as-is otherwise."""
+    if source.endswith('.j2'):
+        return render_template(source, role_variables(role, host))
+    with open(source, 'r') as f:
+        return f.read()
+
+
+def normalize(content):
+    """Drop blank lines and surrounding whitespace, which do not change these configs."""
+    return [line.strip() for line in content.splitlines() if line.strip()]
+
+
+def verify_config_file(transport, host, remote_path, source, role):
+    """Compare a deployed file with what the role renders locally.
+
+    Only the remote sha256 is fetched when the file matches byte for byte; the
+    file itself is transferred on a mismatch, to allow whitespace differences
+    and report a unified diff.
+    """
+    try:
+        expected = expected_content(source, role, host)
+    except (OSError, jinja2.TemplateError, yaml.YAMLError) as e:
+        return False, f"Could not render {source}: {e}"
+
+    digest, = transport.batch([("sha256", remote_path)])
+    if digest is None:
+        return False, f"{remote_path} missing or unreadable"
+    if digest == hashlib.sha256(expected.encode()).hexdigest():
+        return True, f"{remote_path} matches {os.path.basename(source)}"
+
+    remote, = transport.batch([("read_file", remote_path)])
+    if remote is None:
+        return False, f"Failed to read {remote_path}"
+    if normalize(remote) == normalize(expected):
+        return True, f"{remote_path} matches {os.path.basename(source)}"
+    diff = list(difflib.unified_diff([line.rstrip() for line in expected.splitlines() if line.strip()],
+                                     [line.rstrip() for line in remote.splitlines() if line.strip()],
+                                     fromfile=source, tofile=remote_path, lineterm=''))
+    return False, "Config mismatch:\n" + "\n".join(diff[:DIFF_LINES])
@@ -4,8 +4,8 @@ set -e
 echo "$(date) - Running init.py"
 python3 init.py
 
-echo "$(date) - Waiting 10 seconds"
-sleep 10
+echo "$(date) - Waiting for the target host"
+python3 readiness.py || echo "$(date) - Host is not ready, grading anyway"
 
 echo "$(date) - Running autograder.py"
 python3 autograder.py
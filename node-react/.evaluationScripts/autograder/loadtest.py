@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cassette import CASSETTE
+from settings import LOAD_CONCURRENCY, LOAD_DURATION, LOAD_TIMEOUT
+
+# Reports of the load runs of this grading, added to evaluate.json
+_reports = {}
+_reports_lock = threading.Lock()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def summarise(samples, seconds):
+    """Latency percentiles in milliseconds, error rate and throughput of (latency, ok) samples."""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    summary = {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "requests_per_second": round(len(samples) / seconds, 2) if seconds else None,
+    }
+    for name, fraction in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        value = percentile(latencies, fraction)
+        summary[name] = round(value * 1000, 1) if value is not None else None
+    return summary
+
+
+def run_load(base_url, targets, concurrency=LOAD_CONCURRENCY, duration=LOAD_DURATION):
+    """Send requests to the targets from concurrent workers until the duration is up.
+
+    Each worker keeps one keep-alive session and cycles through the targets,
+    starting at a different one. A target is {"method", "path"} with an
+    optional "json" body; any status below 400 counts as a success.
+    """
+    import requests
+
+    samples = {f"{target['method']} {target['path']}": [] for target in targets}
+    samples_lock = threading.Lock()
+    start = time.monotonic()
+    deadline = start + duration
+
+    def worker(offset):
+        with requests.Session() as session:
+            sent = offset
+            while time.monotonic() < deadline:
+                target = targets[sent % len(targets)]
+                sent += 1
+                request_start = time.monotonic()
+                try:
+                    response = session.request(target["method"], base_url + target["path"],
+                                               json=target.get("json"), timeout=LOAD_TIMEOUT)
+                    ok = response.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                latency = time.monotonic() - request_start
+                with samples_lock:
+                    samples[f"{target['method']} {target['path']}"].append((latency, ok))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    seconds = time.monotonic() - start
+
+    return {
+        "concurrency": concurrency,
+        "duration_seconds": round(seconds, 2),
+        "targets": {name: summarise(target_samples, seconds) for name, target_samples in samples.items()},
+        "overall": summarise([sample for target_samples in samples.values() for sample in target_samples], seconds),
+    }
+
+
+def threshold_violations(summary, thresholds):
+    """Compare an overall summary with max_p95_ms, max_p99_ms, max_error_rate and min_requests_per_second."""
+    violations = []
+    for metric, limit in (("p95_ms", thresholds.get("max_p95_ms")),
+                          ("p99_ms", thresholds.get("max_p99_ms")),
+                          ("error_rate", thresholds.get("max_error_rate"))):
+        if limit is not None and (summary[metric] is None or summary[metric] > limit):
+            violations.append(f"{metric} {summary[metric]} above {limit}")
+    minimum = thresholds.get("min_requests_per_second")
+    if minimum is not None and (summary["requests_per_second"] or 0) < minimum:
+        violations.append(f"requests_per_second {summary['requests_per_second']} below {minimum}")
+    return violations
+
+
+def verify_load(name, base_url, targets, thresholds):
+    """Run the load stage and grade its overall summary against the lab's thresholds.
+
+    The report is recorded to the cassette, since a replayed run cannot
+    reproduce live timings, and kept for load_reports().
+    """
+    if CASSETTE.replaying:
+        report = CASSETTE.replay("load", name)
+    else:
+        report = run_load(base_url, targets)
+        if CASSETTE.recording:
+            CASSETTE.record("load", name, report)
+    with _reports_lock:
+        _reports[name] = dict(report, thresholds=thresholds)
+
+    overall = report["overall"]
+    if not overall["requests"]:
+        return False, "No requests completed"
+    violations = threshold_violations(overall, thresholds)
+    description = (f"{overall['requests_per_second']} req/s, p50 {overall['p50_ms']}ms, "
+                   f"p95 {overall['p95_ms']}ms, p99 {overall['p99_ms']}ms, "
+                   f"error rate {overall['error_rate']}")
+    if violations:
+        return False, f"Load thresholds missed ({'; '.join(violations)}): {description}"
+    return True, f"Load thresholds met: {description}"
+
+
+def load_reports():
+    with _reports_lock:
+        return dict(_reports)
@@ -0,0 +1,136 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from settings import TERRAFORM_PLUGIN_CACHE, TERRAFORM_TIMINGS
+
+LOCK_FILE = '.terraform.lock.hcl'
+
+# Written into .terraform/ after a successful init; a matching stamp means init can be skipped
+STAMP_FILE = os.path.join('.terraform', 'grader-init.json')
+
+# Lock files from the first init of each provider set, seeded into new working
+# directories so they skip version lookups
+SHARED_LOCKS_DIR = os.path.join(os.path.dirname(TERRAFORM_PLUGIN_CACHE), 'locks')
+
+
+def terraform_env(credentials=None):
+    """Environment for terraform commands, pointed at the shared plugin cache.
+
+    With credentials, the instructor keys are passed as the access_key and
+    secret_key variables, so they are never written into a .tf file.
+    """
+    os.makedirs(TERRAFORM_PLUGIN_CACHE, exist_ok=True)
+    env = dict(os.environ, TF_PLUGIN_CACHE_DIR=TERRAFORM_PLUGIN_CACHE)
+    if credentials is not None:
+        env["TF_VAR_access_key"] = credentials["Instructor Access key ID"]
+        env["TF_VAR_secret_key"] = credentials["Instructor Secret access key"]
+    return env
+
+
+def required_providers(workdir):
+    """Provider names used by the .tf files of a working directory."""
+    names = set()
+    for path in glob.glob(os.path.join(workdir, '*.tf')):
+        with open(path, 'r') as f:
+            content = f.read()
+        names.update(re.findall(r'^\s*provider\s+"(\w+)"', content, re.M))
+        names.update(re.findall(r'^\s*(?:resource|data)\s+"([a-z0-9]+)_', content, re.M))
+    return sorted(names)
+
+
+def shared_lock_file(workdir):
+    return os.path.join(SHARED_LOCKS_DIR, '-'.join(required_providers(workdir)) + LOCK_FILE)
+
+
+def init_stamp(workdir):
+    lock_path = os.path.join(workdir, LOCK_FILE)
+    if not os.path.exists(lock_path):
+        return None
+    with open(lock_path, 'rb') as f:
+        lock_hash = hashlib.sha256(f.read()).hexdigest()
+    return {"lock": lock_hash, "providers": required_providers(workdir)}
+
+
+def is_initialized(workdir):
+    stamp_path = os.path.join(workdir, STAMP_FILE)
+    if not os.path.exists(stamp_path) or not os.path.isdir(os.path.join(workdir, '.terraform', 'providers')):
+        return False
+    with open(stamp_path, 'r') as f:
+        return json.load(f) == init_stamp(workdir)
+
+
+def record_timing(workdir, mode, seconds):
+    entry = {
+        "workdir": os.path.abspath(workdir),
+        "mode": mode,
+        "seconds": round(seconds, 2),
+        "at": time.time(),
+    }
+    os.makedirs(os.path.dirname(TERRAFORM_TIMINGS), exist_ok=True)
+    with open(TERRAFORM_TIMINGS, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"terraform init ({mode}) in {entry['seconds']}s")
+
+
+def terraform_init(workdir):
+    """Initialise a working directory, skipping init when it is already current.
+
+    Providers come from the shared plugin cache, and a directory without a
+    lock file gets the shared one so terraform does not query the registry.
+    """
+    start = time.monotonic()
+    if is_initialized(workdir):
+        record_timing(workdir, "skipped", time.monotonic() - start)
+        return
+
+    env = terraform_env()
+    shared_lock = shared_lock_file(workdir)
+    if not os.path.exists(os.path.join(workdir, LOCK_FILE)) and os.path.exists(shared_lock):
+        shutil.copy(shared_lock, os.path.join(workdir, LOCK_FILE))
+    mode = "cached" if os.listdir(TERRAFORM_PLUGIN_CACHE) else "cold"
+
+    subprocess.run(["terraform", "init", "-input=false"], cwd=workdir, env=env, check=True)
+
+    if not os.path.exists(shared_lock):
+        os.makedirs(SHARED_LOCKS_DIR, exist_ok=True)
+        shutil.copy(os.path.join(workdir, LOCK_FILE), shared_lock)
+    with open(os.path.join(workdir, STAMP_FILE), 'w') as f:
+        json.dump(init_stamp(workdir), f)
+    record_timing(workdir, mode, time.monotonic() - start)
+
+
+def timing_report():
+    """Summarise recorded init times per mode: cold, cached and skipped."""
+    if not os.path.exists(TERRAFORM_TIMINGS):
+        return "No terraform init timings recorded"
+    timings = {}
+    with open(TERRAFORM_TIMINGS, 'r') as f:
+        for line in f:
+            entry = json.loads(line)
+            timings.setdefault(entry["mode"], []).append(entry["seconds"])
+    lines = []
+    for mode in ("cold", "cached", "skipped"):
+        if mode in timings:
+            seconds = timings[mode]
+            lines.append(f"{mode:8} runs={len(seconds):4} mean={statistics.mean(seconds):7.2f}s "
+                         f"median={statistics.median(seconds):7.2f}s max={max(seconds):7.2f}s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    if command == 'init':
+        terraform_init(sys.argv[2] if len(sys.argv) > 2 else 'terraform')
+    elif command == 'report':
+        print(timing_report())
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,78 @@
+import re
+
+from cassette import http_get
+from settings import STATIC_MAX_AGE
+
+# Build assets referenced by index.html; their names carry a content hash
+ASSET_PATTERN = re.compile(r'(?:src|href)="\.?(/static/[^"]+)"')
+
+# Asset types nginx is expected to serve compressed
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css')
+
+# Sent with every request, so the server may compress and recordings replay under one key
+ACCEPT_GZIP = {"Accept-Encoding": "gzip"}
+
+
+def cache_control(response):
+    """Cache-Control directives of a response as {directive: value}, with None for bare directives."""
+    directives = {}
+    for part in response.headers.get('Cache-Control', '').split(','):
+        directive, _, value = part.strip().partition('=')
+        if directive:
+            directives[directive.lower()] = value.strip('"') or None
+    return directives
+
+
+def fetch_page(base_url):
+    """Fetch index.html and the build assets it references."""
+    index = http_get(f"{base_url}/", headers=ACCEPT_GZIP, timeout=5)
+    if index.status_code != 200:
+        raise ValueError(f"{base_url}/ returned status {index.status_code}")
+    assets = {}
+    for path in sorted(set(ASSET_PATTERN.findall(index.text))):
+        response = http_get(base_url + path, headers=ACCEPT_GZIP, timeout=5)
+        if response.status_code != 200:
+            raise ValueError(f"{path} returned status {response.status_code}")
+        assets[path] = response
+    if not assets:
+        raise ValueError("index.html references no /static assets")
+    return index, assets
+
+
+def verify_compressed_assets(base_url):
+    """Check that the JS and CSS bundles come back gzip-encoded.
+
+    nginx sends a Content-Length only when gzip_static found a precompressed
+    copy; compressing on the fly streams the response chunked.
+    """
+    try:
+        _, assets = fetch_page(base_url)
+    except ValueError as e:
+        return False, str(e)
+    compressible = {path: response for path, response in assets.items() if path.endswith(COMPRESSIBLE_EXTENSIONS)}
+    plain = [path for path, response in compressible.items()
+             if response.headers.get('Content-Encoding') != 'gzip']
+    if plain:
+        return False, f"Served without gzip: {', '.join(plain)}"
+    precompressed = sum(1 for response in compressible.values() if 'Content-Length' in response.headers)
+    return True, f"{len(compressible)} JS/CSS assets served gzip-encoded, {precompressed} of them precompressed"
+
+
+def verify_cache_headers(base_url, max_age=STATIC_MAX_AGE):
+    """Check that hashed assets are cached as immutable for at least max_age and index.html is revalidated."""
+    try:
+        index, assets = fetch_page(base_url)
+    except ValueError as e:
+        return False, str(e)
+    problems = []
+    if 'no-cache' not in cache_control(index):
+        problems.append(f"index.html has Cache-Control '{index.headers.get('Cache-Control', '')}', expected no-cache")
+    for path, response in assets.items():
+        directives = cache_control(response)
+        age = directives.get('max-age') or ''
+        if 'immutable' not in directives or not age.isdigit() or int(age) < max_age:
+            problems.append(f"{path} has Cache-Control '{response.headers.get('Cache-Control', '')}', "
+                            f"expected immutable with max-age {max_age}")
+    if problems:
+        return False, "; ".join(problems)
+    return True, f"{len(assets)} assets cached immutable for {max_age}s, index.html revalidated"
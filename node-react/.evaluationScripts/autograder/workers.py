@@ -0,0 +1,45 @@
+from collections import Counter
+
+from cassette import http_get
+from settings import NODE_BASE_PORT, NODE_WORKERS
+
+# Requests sent through nginx per worker when checking how it spreads them
+REQUESTS_PER_WORKER = 4
+
+# Response header in which the backend names the port of the worker that answered
+WORKER_HEADER = 'X-Worker-Port'
+
+
+def worker_ports(workers=NODE_WORKERS, base=NODE_BASE_PORT):
+    """Ports the backend workers must listen on: workers consecutive ports from base."""
+    return [base + worker for worker in range(workers)]
+
+
+def verify_workers_active(transport, unit, ports):
+    """Check that the instance of a templated unit for every port is active and enabled, in one batch."""
+    states = transport.batch([("systemctl", f"{unit}@{port}") for port in ports])
+    stopped = [f"{unit}@{port} active={state['active']}, enabled={state['enabled']}"
+               for port, state in zip(ports, states)
+               if state["active"] != 'active' or state["enabled"] != 'enabled']
+    if stopped:
+        return False, "Workers not running: " + "; ".join(stopped)
+    return True, f"{len(ports)} workers active and enabled on ports {', '.join(map(str, ports))}"
+
+
+def verify_requests_spread(url, ports):
+    """Send requests through nginx and check that every worker answered some of them."""
+    if len(ports) < 2:
+        return False, f"Only {len(ports)} worker configured, nothing to spread requests across"
+    answered = Counter()
+    for _ in range(REQUESTS_PER_WORKER * len(ports)):
+        response = http_get(url, timeout=5)
+        if response.status_code != 200:
+            return False, f"{url} returned status {response.status_code}"
+        answered[response.headers.get(WORKER_HEADER)] += 1
+    counts = ", ".join(f"{port}: {answered[str(port)]}" for port in ports)
+    idle = [port for port in ports if not answered[str(port)]]
+    if idle:
+        unknown = sum(count for worker, count in answered.items() if worker not in map(str, ports))
+        detail = f", {unknown} without a known {WORKER_HEADER}" if unknown else ""
+        return False, f"Workers on ports {', '.join(map(str, idle))} got no requests ({counts}{detail})"
+    return True, f"Requests spread across {len(ports)} workers ({counts})"
@@ -2,10 +2,16 @@ const express = require('express');
 const bodyParser = require('body-parser');
 
 const app = express();
-const PORT = 5000;
+const PORT = process.env.PORT || 5000;
 
 app.use(bodyParser.json());
 
+// Tells which worker answered when several run behind nginx
+app.use((req, res, next) => {
+    res.set('X-Worker-Port', String(PORT));
+    next();
+});
+
 app.get('/api', (req, res) => {
     res.send('Node-Express App using Ansible');
 });
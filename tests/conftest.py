@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules shared by the labs are byte-identical copies; the tests import the apache2 ones
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOGRADER = os.path.join(ROOT, 'apache2', '.evaluationScripts', 'autograder')
+sys.path.insert(0, AUTOGRADER)
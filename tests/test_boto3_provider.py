@@ -0,0 +1,139 @@
+import json
+import os
+
+import boto3
+import pytest
+from botocore.exceptions import WaiterError
+from moto import mock_aws
+
+import providers
+from conftest import AUTOGRADER
+from providers import Boto3Provider
+
+CREDENTIALS = {
+    "Instructor Access key ID": "testing",
+    "Instructor Secret access key": "testing",
+}
+
+TEMPLATE = os.path.join(AUTOGRADER, 'terraform', 'main.tf')
+
+
+@pytest.fixture
+def ec2(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    with mock_aws():
+        yield boto3.client('ec2', region_name='us-east-1')
+
+
+@pytest.fixture
+def provider(ec2, tmp_path, monkeypatch):
+    monkeypatch.setattr(providers, 'SHARED_DIR', str(tmp_path / 'shared'))
+    monkeypatch.setattr(providers, 'KEY_POOL_SIZE', 2)
+    monkeypatch.setenv("GRADER_BOTO3_WAITER_DELAY", "1")
+    return Boto3Provider(CREDENTIALS, TEMPLATE, client=ec2)
+
+
+def instance_states(ec2):
+    return {instance["InstanceId"]: instance["State"]["Name"]
+            for reservation in ec2.describe_instances()["Reservations"]
+            for instance in reservation["Instances"]}
+
+
+def test_reads_instance_config_from_template(provider):
+    assert provider.ami == "ami-0f9de6e2d2f067fca"
+    assert provider.instance_type == "t2.micro"
+    assert provider.region == "us-east-1"
+    assert provider.waiter_delay == 1
+
+
+def test_create_launches_instance_with_shared_group_and_key(provider, ec2, tmp_path):
+    workdir = str(tmp_path / 'host')
+
+    host = provider.create(workdir)
+
+    instance = ec2.describe_instances()["Reservations"][0]["Instances"][0]
+    assert instance["State"]["Name"] == "running"
+    assert host["public_ip"] == instance["PublicIpAddress"]
+    assert os.path.exists(host["key_file"])
+    assert oct(os.stat(host["key_file"]).st_mode & 0o777) == '0o600'
+
+    with open(os.path.join(provider.shared_dir, 'shared.json'), 'r') as f:
+        shared = json.load(f)
+    assert instance["KeyName"] in [key["key_name"] for key in shared["keys"]]
+    assert [group["GroupId"] for group in instance["SecurityGroups"]] == [shared["security_group_id"]]
+
+    group, = ec2.describe_security_groups(GroupIds=[shared["security_group_id"]])["SecurityGroups"]
+    assert sorted(permission["FromPort"] for permission in group["IpPermissions"]) == [22, 80]
+    assert len(ec2.describe_key_pairs()["KeyPairs"]) == 2
+
+
+def test_shared_resources_are_created_once(provider, ec2, tmp_path):
+    provider.create(str(tmp_path / 'first'))
+    provider.create(str(tmp_path / 'second'))
+
+    assert len(instance_states(ec2)) == 2
+    assert len(ec2.describe_key_pairs()["KeyPairs"]) == 2
+    groups = [group for group in ec2.describe_security_groups()["SecurityGroups"] if group["GroupName"] != 'default']
+    assert len(groups) == 1
+
+
+def test_destroy_terminates_the_instance(provider, ec2, tmp_path):
+    workdir = str(tmp_path / 'host')
+    provider.create(workdir)
+
+    provider.destroy({"workdir": workdir})
+
+    assert list(instance_states(ec2).values()) == ["terminated"]
+
+
+def test_destroy_shared_deletes_group_and_key_pairs(provider, ec2, tmp_path):
+    workdir = str(tmp_path / 'host')
+    provider.create(workdir)
+    provider.destroy({"workdir": workdir})
+    with open(os.path.join(provider.shared_dir, 'shared.json'), 'r') as f:
+        shared = json.load(f)
+
+    provider.destroy_shared()
+
+    assert ec2.describe_key_pairs()["KeyPairs"] == []
+    assert not any(group["GroupId"] == shared["security_group_id"]
+                   for group in ec2.describe_security_groups()["SecurityGroups"])
+    assert not os.path.exists(os.path.join(provider.shared_dir, 'shared.json'))
+    assert not any(os.path.exists(key["key_file"]) for key in shared["keys"])
+
+
+class FailingWaiter:
+    def __init__(self, name):
+        self.name = name
+        self.config = None
+
+    def wait(self, WaiterConfig, **kwargs):
+        self.config = WaiterConfig
+        raise WaiterError(self.name, "Max attempts exceeded", {})
+
+
+def test_waiter_timeout_terminates_the_instance(provider, ec2, tmp_path, monkeypatch):
+    get_waiter = ec2.get_waiter
+    failing = FailingWaiter('instance_status_ok')
+    monkeypatch.setattr(ec2, 'get_waiter',
+                        lambda name: failing if name == 'instance_status_ok' else get_waiter(name))
+
+    with pytest.raises(WaiterError):
+        provider.create(str(tmp_path / 'host'))
+
+    assert failing.config == {"Delay": 1, "MaxAttempts": 600}
+    assert list(instance_states(ec2).values()) == ["terminated"]
+
+
+def test_failed_shared_setup_removes_what_it_created(provider, ec2, monkeypatch):
+    def refuse(**kwargs):
+        raise RuntimeError("security group quota exceeded")
+
+    monkeypatch.setattr(ec2, 'create_security_group', refuse)
+
+    with pytest.raises(RuntimeError):
+        provider.shared_resources()
+
+    assert ec2.describe_key_pairs()["KeyPairs"] == []
+    assert not os.path.exists(os.path.join(provider.shared_dir, 'shared.json'))
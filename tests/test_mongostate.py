@@ -0,0 +1,67 @@
+import hashlib
+import importlib.util
+import os
+
+import pytest
+
+from conftest import ROOT
+
+# Only the mongodb grader checks database state, so the module is not among the apache2 copies
+spec = importlib.util.spec_from_file_location(
+    'mongostate', os.path.join(ROOT, 'mongodb', '.evaluationScripts', 'autograder', 'mongostate.py'))
+mongostate = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mongostate)
+
+
+@pytest.mark.parametrize("value, text", [
+    (10.0, "10"),
+    (1.5, "1.5"),
+    (-0.000123, "-0.000123"),
+    (1e-05, "0.00001"),
+    (2.5e-07, "2.5e-7"),
+    (1e21, "1e+21"),
+    (1.5e21, "1.5e+21"),
+])
+def test_floats_are_formatted_like_json_stringify(value, text):
+    assert mongostate.js_number(value) == text
+
+
+def test_shell_helpers_become_the_values_mongosh_prints():
+    document = mongostate.js_to_json(
+        '{ joined: ISODate("2024-01-02T03:04:05.123+02:00"), born: new Date("2024-01-01"), '
+        'epoch: new Date(86400000), age: NumberInt(30), visits: NumberLong("9"), score: 10.0 }'
+    )
+
+    assert mongostate.canonical(document) == (
+        '{"age":30,"born":{"$date":"2024-01-01T00:00:00.000Z"},"epoch":{"$date":"1970-01-02T00:00:00.000Z"},'
+        '"joined":{"$date":"2024-01-02T01:04:05.123Z"},"score":10,"visits":9}'
+    )
+
+
+def test_date_without_argument_is_rejected():
+    with pytest.raises(ValueError):
+        mongostate.js_to_json('{ at: new Date() }')
+
+
+def test_expected_state_digests_canonical_documents(tmp_path):
+    script = tmp_path / 'populate.js'
+    script.write_text(
+        'db.Users.deleteMany({});\n'
+        'db.Users.insertMany([\n'
+        '    { user_id: 2, name: "Bob", balance: 10.0, joined: ISODate("2024-01-01T00:00:00Z") },\n'
+        '    { user_id: 1, name: "Alice", balance: 2.5 },\n'
+        ']);\n'
+        'db.Users.createIndex({ user_id: 1 }, { unique: true });\n'
+    )
+
+    expected = mongostate.expected_state(str(script))
+
+    documents = sorted([
+        '{"balance":10,"joined":{"$date":"2024-01-01T00:00:00.000Z"},"name":"Bob","user_id":2}',
+        '{"balance":2.5,"name":"Alice","user_id":1}',
+    ])
+    assert expected == {"Users": {
+        "count": 2,
+        "digest": hashlib.sha256("\n".join(documents).encode()).hexdigest(),
+        "indexes": [mongostate.DEFAULT_INDEX, {"name": "user_id_1", "key": {"user_id": 1}}],
+    }}
@@ -0,0 +1,240 @@
+import fcntl
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import pool
+from pool import HostPool
+from providers import FakeProvider, account_key
+
+CREDENTIALS = {
+    "Instructor Access key ID": "test-access-key",
+    "Instructor Secret access key": "test-secret-key",
+}
+
+
+class RecordingProvider(FakeProvider):
+    """FakeProvider that remembers which hosts it destroyed."""
+
+    def __init__(self):
+        super().__init__()
+        self.destroyed = []
+        self.shared_destroyed = False
+
+    def destroy(self, host):
+        self.destroyed.append(host["id"])
+
+    def destroy_shared(self):
+        self.shared_destroyed = True
+
+
+@pytest.fixture
+def provider():
+    return RecordingProvider()
+
+
+@pytest.fixture
+def host_pool(tmp_path, provider):
+    return HostPool(str(tmp_path), 2, provider)
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_refill_provisions_up_to_size(host_pool):
+    host_pool.refill()
+    ready = host_pool.records('ready')
+    assert len(ready) == 2
+    assert all(os.path.exists(host["key_file"]) for host in ready)
+    assert os.listdir(os.path.join(host_pool.root, 'provisioning')) == []
+
+    host_pool.refill()
+    assert len(host_pool.records('ready')) == 2
+
+
+def test_refill_counts_hosts_in_flight(host_pool):
+    open(os.path.join(host_pool.root, 'provisioning', 'inflight'), 'w').close()
+    host_pool.refill()
+    assert len(host_pool.records('ready')) == 1
+
+
+def test_refill_drops_stale_provisioning_markers(host_pool):
+    marker = os.path.join(host_pool.root, 'provisioning', 'dead')
+    open(marker, 'w').close()
+    age(marker, pool.PROVISIONING_TIMEOUT + 60)
+    host_pool.refill()
+    assert len(host_pool.records('ready')) == 2
+    assert not os.path.exists(marker)
+
+
+def test_lease_takes_oldest_ready_host(host_pool):
+    host_pool.refill()
+    oldest = host_pool.records('ready')[0]
+
+    host = host_pool.lease(holder='submission-1')
+
+    assert host["id"] == oldest["id"]
+    assert host["holder"] == 'submission-1'
+    assert [record["id"] for record in host_pool.records('leased')] == [host["id"]]
+    assert len(host_pool.records('ready')) == 1
+
+
+def test_lease_provisions_when_pool_is_empty(host_pool):
+    host = host_pool.lease(holder='submission-1')
+    assert host["provider"] == FakeProvider.name
+    assert host_pool.records('ready') == []
+    assert len(host_pool.records('leased')) == 1
+
+
+def test_release_destroys_host_without_recycling(host_pool, provider):
+    host = host_pool.lease(holder='submission-1')
+
+    assert host_pool.release(host) is False
+
+    assert provider.destroyed == [host["id"]]
+    assert host_pool.records('leased') == []
+    assert not os.path.exists(host["workdir"])
+
+
+def test_release_recycles_host_that_passes_the_check(host_pool, provider):
+    host = host_pool.lease(holder='submission-1')
+
+    assert host_pool.release(host, lambda host: (True, "clean")) is True
+
+    ready, = host_pool.records('ready')
+    assert ready["id"] == host["id"]
+    assert ready["recycled"] == 1
+    assert "holder" not in ready
+    assert provider.destroyed == []
+
+
+def test_release_destroys_host_that_fails_the_check(host_pool, provider):
+    host = host_pool.lease(holder='submission-1')
+
+    def recycle(host):
+        raise RuntimeError("cleanup.sh failed")
+
+    assert host_pool.release(host, recycle) is False
+    assert provider.destroyed == [host["id"]]
+    assert host_pool.records('ready') == []
+
+
+def test_refill_destroys_hosts_of_stale_leases(host_pool, provider):
+    stale = host_pool.lease(holder='dead-submission')
+    current = host_pool.lease(holder='live-submission')
+    stale["leased_at"] -= pool.LEASE_TIMEOUT + 60
+    with host_pool.locked():
+        host_pool.write_record('leased', stale)
+
+    host_pool.refill()
+
+    assert provider.destroyed == [stale["id"]]
+    assert [host["id"] for host in host_pool.records('leased')] == [current["id"]]
+    assert len(host_pool.records('ready')) == 2
+
+
+def test_drain_destroys_hosts_and_shared_resources(host_pool, provider):
+    host_pool.refill()
+    ready = [host["id"] for host in host_pool.records('ready')]
+
+    host_pool.drain()
+
+    assert provider.destroyed == ready
+    assert host_pool.records('ready') == []
+    assert provider.shared_destroyed
+
+
+def test_drain_keeps_shared_resources_while_hosts_are_leased(host_pool, provider):
+    host_pool.refill()
+    host_pool.lease(holder='submission-1')
+
+    host_pool.drain()
+
+    assert host_pool.records('ready') == []
+    assert not provider.shared_destroyed
+
+
+def hold_and_probe(root, connection):
+    """Report whether the pool lock can be taken without waiting."""
+    with open(os.path.join(root, 'pool.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            connection.send(False)
+        else:
+            connection.send(True)
+
+
+def test_lock_excludes_other_processes(host_pool):
+    parent, child = multiprocessing.Pipe()
+    with host_pool.locked():
+        process = multiprocessing.Process(target=hold_and_probe, args=(host_pool.root, child))
+        process.start()
+        assert parent.recv() is False
+        process.join()
+
+    process = multiprocessing.Process(target=hold_and_probe, args=(host_pool.root, child))
+    process.start()
+    assert parent.recv() is True
+    process.join()
+
+
+def lease_in_process(root, queue):
+    queue.put(HostPool(root, 4, FakeProvider()).lease(holder=str(os.getpid()))["id"])
+
+
+def test_concurrent_leases_get_distinct_hosts(tmp_path):
+    host_pool = HostPool(str(tmp_path), 4, FakeProvider())
+    host_pool.refill()
+    ready = {host["id"] for host in host_pool.records('ready')}
+
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=lease_in_process, args=(host_pool.root, queue))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    leased = [queue.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert sorted(leased) == sorted(ready)
+    assert host_pool.records('ready') == []
+    assert len(host_pool.records('leased')) == 4
+
+
+def test_refill_async_refills_in_background_without_credentials_in_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRADER_POOL_DIR", str(tmp_path))
+    monkeypatch.setenv("GRADER_POOL_PROVIDER", FakeProvider.name)
+    monkeypatch.setenv("GRADER_POOL_SIZE", "2")
+    host_pool = HostPool(os.path.join(str(tmp_path), account_key(CREDENTIALS)), 2, FakeProvider())
+
+    popen = subprocess.Popen
+    spawned = []
+
+    def recording_popen(*args, **kwargs):
+        spawned.append(kwargs)
+        return popen(*args, **kwargs)
+
+    monkeypatch.setattr(pool.subprocess, 'Popen', recording_popen)
+    host_pool.refill_async(CREDENTIALS)
+
+    deadline = time.time() + 30
+    while len(host_pool.records('ready')) < 2 and time.time() < deadline:
+        time.sleep(0.1)
+    assert len(host_pool.records('ready')) == 2
+
+    environment = spawned[0].get("env") or os.environ
+    assert CREDENTIALS["Instructor Secret access key"] not in json.dumps(dict(environment))
+
+
+def test_load_credentials_from_stdin(monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(json.dumps(CREDENTIALS)))
+    assert pool.load_credentials(from_stdin=True) == CREDENTIALS
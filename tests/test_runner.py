@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from runner import run_test_cases
+
+
+def make_run_test(log):
+    lock = threading.Lock()
+
+    def run_test(test, prerequisite=None):
+        if prerequisite:
+            return {"testid": test["testid"], "status": "failure", "skipped_for": prerequisite}
+        with lock:
+            log.append(("start", test["testid"]))
+        time.sleep(test.get("seconds", 0))
+        with lock:
+            log.append(("end", test["testid"]))
+        return {"testid": test["testid"], "status": "success" if test.get("passes", True) else "failure"}
+
+    return run_test
+
+
+@pytest.mark.parametrize("executor", ["serial", "threads"])
+def test_after_orders_without_skipping(executor):
+    log = []
+    test_cases = [
+        {"testid": "paging", "passes": False, "seconds": 0.2},
+        {"testid": "load", "after": ["paging"]},
+    ]
+
+    results = run_test_cases(test_cases, make_run_test(log), executor, max_workers=4)
+
+    assert [result["status"] for result in results] == ["failure", "success"]
+    assert log.index(("end", "paging")) < log.index(("start", "load"))
+
+
+def test_failed_requirement_still_skips():
+    results = run_test_cases(
+        [{"testid": "api", "passes": False}, {"testid": "balancing", "requires": ["api"]}],
+        make_run_test([]), "threads", max_workers=4
+    )
+    assert results[1]["skipped_for"] == "api"
+
+
+def test_after_must_name_an_earlier_test():
+    with pytest.raises(ValueError):
+        run_test_cases([{"testid": "load", "after": ["paging"]}, {"testid": "paging"}], make_run_test([]))
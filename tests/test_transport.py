@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+import transport
+from transport import AgentTransport, HostUnreachable, MultiplexedSSHTransport, SSHTransport, agent_requests
+
+
+class LocalAgentTransport(AgentTransport):
+    """AgentTransport that runs the agent locally through sh instead of ssh."""
+
+    argv = ["sh", "-c"]
+
+    def ssh_argv(self, *options):
+        return list(self.argv)
+
+
+@pytest.fixture
+def local_agent(monkeypatch):
+    monkeypatch.setattr(MultiplexedSSHTransport, 'open', lambda self: None)
+    monkeypatch.setattr(MultiplexedSSHTransport, 'close', lambda self: None)
+    agent = LocalAgentTransport("key.pem", "ubuntu", "localhost")
+    yield agent
+    agent.close()
+
+
+def test_agent_answers_a_batch(local_agent):
+    local_agent.open()
+
+    replies = local_agent.call_agent(agent_requests([("exec", "echo one"), ("exists", "/")]))
+
+    assert [reply["id"] for reply in replies] == [0, 1]
+    assert replies[0]["result"]["stdout"] == "one"
+    assert replies[1]["result"] is True
+
+
+def test_concurrent_calls_do_not_wait_for_each_other(local_agent):
+    local_agent.open()
+    results = {}
+
+    def call(index):
+        results[index] = local_agent.execute(f"sleep 1; echo {index}")
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(4)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start < 3
+    assert results == {index: (str(index), None) for index in range(4)}
+    assert local_agent.calls == 4
+
+
+def test_agent_that_never_starts_falls_back(local_agent, monkeypatch):
+    monkeypatch.setattr(transport, 'AGENT_START_TIMEOUT', 0.5)
+    local_agent.argv = ["sh", "-c", "sleep 30"]
+
+    start = time.monotonic()
+    local_agent.open()
+
+    assert time.monotonic() - start < 10
+    assert local_agent.process is None
+    assert local_agent.unreachable is None
+
+
+def test_lost_agent_marks_host_unreachable(local_agent):
+    local_agent.open()
+
+    with pytest.raises(HostUnreachable):
+        local_agent.execute("kill -9 $PPID")
+    assert "probe agent" in local_agent.unreachable
+
+    with pytest.raises(HostUnreachable):
+        local_agent.execute("echo late")
+
+
+class LocalSSHTransport(SSHTransport):
+    """SSHTransport that runs commands locally through sh instead of ssh."""
+
+    argv = ["sh", "-c"]
+
+    def ssh_argv(self, *options):
+        return list(self.argv)
+
+
+def test_command_exiting_255_does_not_mark_host_unreachable():
+    local = LocalSSHTransport("key.pem", "ubuntu", "localhost")
+
+    out, err = local.execute("echo remote failure >&2; exit 255")
+
+    assert out is None
+    assert err == "Error: remote failure"
+    assert local.unreachable is None
+    assert local.execute("echo still here") == ("still here", None)
+
+
+def test_lost_connection_marks_host_unreachable():
+    local = LocalSSHTransport("key.pem", "ubuntu", "localhost")
+    local.argv = ["sh", "-c", "echo 'ssh: connect to host localhost port 22: Connection refused' >&2; exit 255"]
+
+    with pytest.raises(HostUnreachable):
+        local.execute("true")
+    assert "Connection refused" in local.unreachable